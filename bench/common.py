@@ -0,0 +1,76 @@
+"""
+Utilidades compartidas por los benchmarks de bench/.
+
+Los benchmarks se ejecutan desde la raíz del repositorio (python bench/<script>.py) y trabajan en un directorio temporal,
+sin tocar data/.
+"""
+from collections import namedtuple
+from contextlib import contextmanager
+from pathlib import Path
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+Member = namedtuple("Member", ["id", "name", "discriminator", "mention"])
+
+
+def member(player_id):
+    return Member(player_id, "jugador{}".format(player_id), "0000", "<@{}>".format(player_id))
+
+
+@contextmanager
+def temp_workdir():
+    # open_db usa rutas relativas (data/<id>.db)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        Path("data").mkdir()
+        try:
+            yield Path(workdir)
+        finally:
+            os.chdir(cwd)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class LagMonitor:
+    """
+    Mide el retraso del bucle de eventos: una tarea duerme interval segundos una y otra vez y anota cuánto tarda de más
+    en despertar.
+    """
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.lags = []
+        self.task = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lags.append(loop.time() - start - self.interval)
+
+    def __enter__(self):
+        self.task = asyncio.ensure_future(self.run())
+        return self
+
+    def __exit__(self, *exc):
+        self.task.cancel()
+
+    def report(self):
+        return "retraso del bucle: p50 {:.2f} ms, p99 {:.2f} ms, máximo {:.2f} ms".format(
+            1000 * percentile(self.lags, 0.5), 1000 * percentile(self.lags, 0.99), 1000 * max(self.lags))
+
+
+def timed(func, *args, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(*args)
+    return (time.perf_counter() - start) / repeat, result
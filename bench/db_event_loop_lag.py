@@ -0,0 +1,69 @@
+"""
+Retraso del bucle de eventos con muchos !done simultáneos en un servidor.
+
+Compara las consultas ejecutadas directamente en el bucle, como antes de GuildDB, con las ejecutadas en el hilo de la
+base de datos mediante GuildDB.write_many.
+
+    python bench/db_event_loop_lag.py [envíos]
+"""
+import asyncio
+import sys
+
+from common import LagMonitor, member, temp_workdir
+
+from src.db_utils import (GuildDB, open_db, commit_db, insert_player, insert_async, save_async_result,
+                          configure_storage)
+
+GUILD = 1
+
+
+def create_race():
+    db_conn, db_cur = open_db(GUILD)
+    insert_player(db_cur, member(0))
+    insert_async(db_cur, "bench", 0, "open", None, None, None, 1, 2, 3, 4, 5)
+    commit_db(db_conn)
+    db_conn.close()
+
+
+async def done_on_loop(db_conn, player):
+    # Comportamiento anterior: consultas síncronas dentro de la corrutina
+    db_cur = db_conn.cursor()
+    insert_player(db_cur, member(player))
+    save_async_result(db_cur, 1, player, 5000 + player, 100)
+    commit_db(db_conn)
+    await asyncio.sleep(0)
+
+
+async def done_on_thread(db, player):
+    await db.write_many((insert_player, member(player)), (save_async_result, 1, player, 5000 + player, 100))
+
+
+async def bench(submissions, on_thread):
+    create_race()
+    if on_thread:
+        db = GuildDB(GUILD)
+        with LagMonitor() as monitor:
+            await asyncio.sleep(0.01)
+            await asyncio.gather(*(done_on_thread(db, p) for p in range(1, submissions + 1)))
+        db.close(wait=True)
+    else:
+        db_conn, _ = open_db(GUILD)
+        with LagMonitor() as monitor:
+            await asyncio.sleep(0.01)
+            await asyncio.gather(*(done_on_loop(db_conn, p) for p in range(1, submissions + 1)))
+        db_conn.close()
+    return monitor
+
+
+def main():
+    submissions = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    # synchronous = FULL hace visible el coste de cada commit, como en un disco lento
+    configure_storage({"synchronous": "FULL"})
+    for on_thread, label in ((False, "en el bucle"), (True, "en GuildDB")):
+        with temp_workdir():
+            monitor = asyncio.run(bench(submissions, on_thread))
+        print("{} envíos {:12s} {}".format(submissions, label, monitor.report()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Rendimiento de escritura según el número de servidores con actividad simultánea.
+
+Cada servidor recibe el mismo número de !done a la vez. Como cada base de datos tiene su propio hilo de escritura, el
+total de escrituras por segundo debería crecer con el número de servidores en lugar de quedarse fijo. Como control,
+la misma carga se repite con un único cerrojo compartido por todos los servidores, que serializa todas las escrituras.
+
+    python bench/db_guild_scaling.py [envíos por servidor]
+"""
+import asyncio
+import sys
+import time
+
+from common import member, temp_workdir
+
+from src.db_utils import (db_pool, guild_db, open_db, commit_db, insert_player, insert_async, save_async_result,
+                          configure_storage)
+
+
+def create_race(guild):
+    db_conn, db_cur = open_db(guild)
+    insert_player(db_cur, member(0))
+    insert_async(db_cur, "bench", 0, "open", None, None, None, 1, 2, 3, 4, 5)
+    commit_db(db_conn)
+    db_conn.close()
+
+
+async def submit(guild, player, global_lock):
+    async with guild_db(guild) as db:
+        async with global_lock or db.write_lock:
+            await db.write_many((insert_player, member(player)), (save_async_result, 1, player, 5000 + player, 100))
+
+
+async def bench(guilds, submissions, shared):
+    for guild in range(1, guilds + 1):
+        create_race(guild)
+    global_lock = asyncio.Lock() if shared else None
+    start = time.perf_counter()
+    await asyncio.gather(*(submit(guild, player, global_lock) for guild in range(1, guilds + 1)
+                           for player in range(1, submissions + 1)))
+    elapsed = time.perf_counter() - start
+    db_pool.close_all()
+    return elapsed
+
+
+def main():
+    submissions = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    configure_storage({"synchronous": "FULL"})
+    base = None
+    print("servidores   por servidor (escrituras/s)   cerrojo global (escrituras/s)")
+    for guilds in (1, 2, 4, 8, 16):
+        throughputs = []
+        for shared in (False, True):
+            with temp_workdir():
+                elapsed = asyncio.run(bench(guilds, submissions, shared))
+            throughputs.append(guilds * submissions / elapsed)
+        base = base or throughputs[0]
+        print("{:10d}   {:10.0f} (x{:4.1f})            {:10.0f} (x{:4.1f})".format(
+            guilds, throughputs[0], throughputs[0] / base, throughputs[1], throughputs[1] / base))
+
+
+if __name__ == "__main__":
+    main()
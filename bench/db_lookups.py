@@ -0,0 +1,59 @@
+"""
+Coste de las consultas más frecuentes según el tamaño del historial de carreras, con y sin los índices de la migración 1.
+
+    python bench/db_lookups.py
+"""
+import random
+
+from common import temp_workdir, timed
+
+from src.db_utils import (open_db, commit_db, get_async_by_submit, get_private_race_by_channel, get_active_async_races,
+                          get_leaderboard_for_race)
+
+INDEXES = ("AsyncRacesSubmitChannel", "AsyncRacesStatus", "PrivateRacesPrivateChannel", "PrivateRacesStatus",
+           "AsyncResultsRanking")
+RESULTS_PER_RACE = 10
+REPEAT = 200
+
+
+def fill(db_conn, db_cur, races):
+    db_cur.executemany("INSERT INTO Players VALUES (?, ?, '0000', '')", [(p, "p{}".format(p)) for p in range(100)])
+    db_cur.executemany('''INSERT INTO AsyncRaces (Id, Name, Creator, StartDate, Status, Preset, RoleId, SubmitChannel,
+                       ResultsChannel, ResultsMessage, SpoilersChannel) VALUES (?, ?, 0, '2024-01-01', ?, 'open', 0, ?, 0, 0, 0)''',
+                       [(r, "r{}".format(r), 2 if r < races - 5 else 0, 1000000 + r) for r in range(1, races + 1)])
+    db_cur.executemany('''INSERT INTO PrivateRaces (Name, Creator, StartDate, Status, PrivateChannel)
+                       VALUES ('p', 0, '2024-01-01', 2, ?)''', [(2000000 + r, ) for r in range(1, races + 1)])
+    db_cur.executemany('''INSERT INTO AsyncResults (Race, Player, Timestamp, Time, CollectionRate)
+                       VALUES (?, ?, '2024-01-01', ?, 100)''',
+                       [(r, p, random.randint(3600, 14400)) for r in range(1, races + 1) for p in range(RESULTS_PER_RACE)])
+    commit_db(db_conn)
+
+
+def bench(races, indexed):
+    with temp_workdir():
+        db_conn, db_cur = open_db(1)
+        if not indexed:
+            for index in INDEXES:
+                db_cur.execute("DROP INDEX {}".format(index))
+        fill(db_conn, db_cur, races)
+        race = random.randint(1, races)
+        times = [
+            timed(get_async_by_submit, db_cur, 1000000 + race, repeat=REPEAT)[0],
+            timed(get_private_race_by_channel, db_cur, 2000000 + race, repeat=REPEAT)[0],
+            timed(get_active_async_races, db_cur, repeat=REPEAT)[0],
+            timed(get_leaderboard_for_race, db_cur, race, repeat=REPEAT)[0],
+        ]
+        db_conn.close()
+    return times
+
+
+def main():
+    print("carreras  índices   submit    privada   activas   leaderboard (µs por consulta)")
+    for races in (1000, 10000, 100000):
+        for indexed in (False, True):
+            times = bench(races, indexed)
+            print("{:7d}   {:5s} ".format(races, "sí" if indexed else "no") + "".join("{:10.1f}".format(1e6 * t) for t in times))
+
+
+if __name__ == "__main__":
+    main()
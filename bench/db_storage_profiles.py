@@ -0,0 +1,48 @@
+"""
+Latencia de commit tras cada save_async_result con distintos perfiles de almacenamiento.
+
+    python bench/db_storage_profiles.py [commits]
+"""
+import sys
+import time
+
+from common import member, percentile, temp_workdir
+
+from src.db_utils import (STORAGE_PROFILE, open_db, commit_db, insert_player, insert_async, save_async_result,
+                          configure_storage)
+
+PROFILES = {
+    "por defecto de SQLite": {"journal_mode": "DELETE", "synchronous": "FULL", "mmap_size": "0", "cache_size": "-2000"},
+    "WAL + FULL": {"journal_mode": "WAL", "synchronous": "FULL"},
+    "WAL + NORMAL": {"journal_mode": "WAL", "synchronous": "NORMAL"},
+}
+
+
+def bench(commits):
+    with temp_workdir():
+        db_conn, db_cur = open_db(1)
+        insert_player(db_cur, member(0))
+        insert_async(db_cur, "bench", 0, "open", None, None, None, 1, 2, 3, 4, 5)
+        commit_db(db_conn)
+        latencies = []
+        for player in range(1, commits + 1):
+            save_async_result(db_cur, 1, player, 5000 + player, 100)
+            start = time.perf_counter()
+            commit_db(db_conn)
+            latencies.append(time.perf_counter() - start)
+        db_conn.close()
+    return latencies
+
+
+def main():
+    commits = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    default_profile = dict(STORAGE_PROFILE)
+    for name, profile in PROFILES.items():
+        configure_storage({**default_profile, **profile})
+        latencies = bench(commits)
+        print("{:22s} commit: p50 {:.3f} ms, p99 {:.3f} ms".format(
+            name, 1000 * percentile(latencies, 0.5), 1000 * percentile(latencies, 0.99)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Estadísticas de jugadores sobre un historial de 1M de resultados (20k carreras, 5k jugadores): reconstrucción de las
+tablas en la migración 3, coste de registrar un resultado, de !stats y de !ranking, y coste de la mediana para un
+jugador con muchas carreras del mismo preset.
+
+    python bench/player_stats.py
+"""
+import random
+import statistics
+
+from common import temp_workdir, timed
+
+from src.db_utils import (open_db, commit_db, save_async_result, get_player_stats, get_preset_ranking, FORFEIT_TIME,
+                          PLAYER_STATS_BACKFILL)
+
+RACES = 20000
+PLAYERS = 5000
+RESULTS_PER_RACE = 50
+# AsyncRaces.Preset y AsyncRaces.PresetName: presets del registro, con y sin opciones extra, descripciones libres y
+# carreras anteriores a la columna PresetName
+PRESETS = [("open", "open"), ("open botas", "open"), ("standard", "standard"), ("standard pistas", "standard"),
+           ("mystery", "mystery"), ("Carrera semanal", None), ("open", None), (None, None)]
+REPEAT = 200
+
+
+def fill(db_conn, db_cur):
+    db_cur.executemany("INSERT INTO Players VALUES (?, ?, '0000', '')", [(p, "p{}".format(p)) for p in range(PLAYERS)])
+    db_cur.executemany('''INSERT INTO AsyncRaces (Id, Name, Creator, StartDate, Status, Preset, RoleId, SubmitChannel,
+                       ResultsChannel, ResultsMessage, SpoilersChannel, PresetName)
+                       VALUES (?, ?, 0, '2024-01-01', 2, ?, 0, ?, 0, 0, 0, ?)''',
+                       [(r, "r{}".format(r), preset, r, preset_name)
+                        for r, (preset, preset_name) in zip(range(1, RACES + 1), random.choices(PRESETS, k=RACES))])
+    db_cur.executemany('''INSERT INTO AsyncResults (Race, Player, Timestamp, Time, CollectionRate)
+                       VALUES (?, ?, '2024-01-01', ?, ?)''',
+                       [(r, p, FORFEIT_TIME if random.random() < 0.1 else random.randint(3600, 14400), random.randint(0, 216))
+                        for r in range(1, RACES + 1) for p in random.sample(range(PLAYERS), RESULTS_PER_RACE)])
+    commit_db(db_conn)
+
+
+def raw_stats(db_cur, player):
+    # Las mismas estadísticas calculadas directamente desde AsyncResults
+    rows = db_cur.execute('''SELECT COALESCE(AsyncRaces.PresetName, ''), AsyncResults.Time, AsyncResults.CollectionRate
+                          FROM AsyncResults JOIN AsyncRaces ON AsyncRaces.Id = AsyncResults.Race
+                          WHERE AsyncResults.Player = ?''', (player, )).fetchall()
+    by_preset = {}
+    for preset, time, collection in rows:
+        by_preset.setdefault(preset, []).append((time, collection))
+    stats = []
+    for preset, results in by_preset.items():
+        finished = [(t, c) for t, c in results if t < FORFEIT_TIME]
+        times = sorted(t for t, _ in finished)
+        median = int(statistics.median(times)) if times else None
+        stats.append((preset, len(results), len(results) - len(finished), times[0] if times else None, median,
+                      sum(c for _, c in finished) / len(finished) if finished else 0))
+    return sorted(stats, key=lambda s: (-s[1], s[0]))
+
+
+def main():
+    with temp_workdir():
+        db_conn, db_cur = open_db(1)
+        fill(db_conn, db_cur)
+        print("{} resultados en {} carreras, {} jugadores".format(RACES * RESULTS_PER_RACE, RACES, PLAYERS))
+
+        # Las tablas se rellenan con la misma consulta que usa la migración 3 con el historial ya cargado
+        elapsed, _ = timed(db_cur.executescript, "BEGIN;" + PLAYER_STATS_BACKFILL + "COMMIT;")
+        print("migración 3 (reconstrucción de PlayerStats y PlayerResults): {:.2f} s".format(elapsed))
+
+        players = random.sample(range(PLAYERS), 20)
+        mismatches = [p for p in players if get_player_stats(db_cur, p) != raw_stats(db_cur, p)]
+        print("estadísticas de 20 jugadores iguales al cálculo directo: {}".format("sí" if not mismatches else mismatches))
+
+        races = random.sample(range(1, RACES + 1), REPEAT)
+        elapsed, _ = timed(lambda: [save_async_result(db_cur, r, random.randrange(PLAYERS), random.randint(3600, 14400), 100)
+                                    for r in races])
+        commit_db(db_conn)
+        print("save_async_result: {:.3f} ms".format(1000 * elapsed / REPEAT))
+
+        player = players[0]
+        print("!stats: {:.3f} ms, cálculo directo: {:.1f} ms".format(
+            1000 * timed(get_player_stats, db_cur, player, repeat=REPEAT)[0], 1000 * timed(raw_stats, db_cur, player)[0]))
+        print("!ranking: {:.3f} ms".format(1000 * timed(get_preset_ranking, db_cur, "open", repeat=REPEAT)[0]))
+
+        # La mediana salta la mitad de los tiempos del jugador en el preset: crece con sus carreras, no con el historial
+        print("carreras del jugador en el preset   !stats (ms)")
+        heavy = PLAYERS
+        db_cur.execute("INSERT INTO Players VALUES (?, 'heavy', '0000', '')", (heavy, ))
+        played = 0
+        for total in (100, 1000, 10000):
+            for race in range(RACES + played + 1, RACES + total + 1):
+                db_cur.execute('''INSERT INTO AsyncRaces (Id, Name, Creator, StartDate, Status, Preset, RoleId,
+                               SubmitChannel, ResultsChannel, ResultsMessage, SpoilersChannel, PresetName)
+                               VALUES (?, 'h', 0, '2024-01-01', 2, 'open', 0, ?, 0, 0, 0, 'open')''', (race, race))
+                save_async_result(db_cur, race, heavy, random.randint(3600, 14400), 100)
+            played = total
+            commit_db(db_conn)
+            print("{:33d}   {:.3f}".format(total, 1000 * timed(get_player_stats, db_cur, heavy, repeat=REPEAT)[0]))
+        db_conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Coste de procesar los YAML de ajustes de rando-settings/: yaml con el cargador de Python puro, con CSafeLoader, y
+load_settings con la caché ya llena.
+
+    python bench/settings_cache.py
+"""
+from pathlib import Path
+
+import yaml
+
+from common import timed
+
+from src.settings_cache import load_settings, SettingsLoader
+
+SETTINGS_DIR = Path(__file__).resolve().parent.parent / "rando-settings"
+REPEAT = 20
+
+
+def main():
+    files = sorted(SETTINGS_DIR.glob("*/*.yaml"))
+    contents = [path.read_bytes() for path in files]
+    print("Cargador: {}, {} ficheros".format(SettingsLoader.__name__, len(files)))
+
+    totals = [0, 0, 0]
+    print("fichero                              KiB   python    C         caché (ms por carga)")
+    for path, content in zip(files, contents):
+        load_settings(content)
+        times = [
+            timed(yaml.load, content, yaml.SafeLoader, repeat=REPEAT)[0],
+            timed(yaml.load, content, SettingsLoader, repeat=REPEAT)[0],
+            timed(load_settings, content, repeat=REPEAT)[0],
+        ]
+        totals = [total + t for total, t in zip(totals, times)]
+        print("{:34s} {:5.1f} ".format(str(path.relative_to(SETTINGS_DIR)), len(content) / 1024) +
+              "".join("{:10.3f}".format(1000 * t) for t in times))
+    print("{:40s} ".format("total") + "".join("{:10.3f}".format(1000 * t) for t in totals))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Coste de formatear el spoiler de una seed de ALTTPR antes de enviarlo: el método anterior, que volcaba el JSON y
+reemplazaba después cada código de mazmorra, contra format_spoiler.
+
+fixtures/spoiler_open.json tiene la forma que devuelve pyz3r con get_formatted_spoiler() para una seed open sin
+entrance shuffle, con las 216 localizaciones del juego.
+
+    python bench/spoiler_format.py
+"""
+from pathlib import Path
+import json
+
+from common import timed
+
+from src.spoiler import DUNGEON_CODES, format_spoiler
+
+FIXTURE = Path(__file__).resolve().parent / "fixtures" / "spoiler_open.json"
+REPEAT = 500
+
+
+def format_spoiler_replace(spoiler):
+    spoiler_dumps = json.dumps(spoiler, indent=4)
+    for k, v in DUNGEON_CODES.items():
+        spoiler_dumps = spoiler_dumps.replace(k, v)
+    return spoiler_dumps.encode("utf-8")
+
+
+def main():
+    spoiler = json.loads(FIXTURE.read_text(encoding="utf-8"))
+    old_time, old = timed(format_spoiler_replace, spoiler, repeat=REPEAT)
+    new_time, new = timed(format_spoiler, spoiler, repeat=REPEAT)
+    print("Spoiler de {} KiB, salida idéntica: {}".format(len(new) // 1024, "sí" if old == new else "NO"))
+    print("json + reemplazos: {:.3f} ms".format(1000 * old_time))
+    print("format_spoiler:    {:.3f} ms".format(1000 * new_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,112 @@
 from configparser import ConfigParser
 from pathlib import Path
 
-import logging
+import time
 
-from src.seedgen import Seedgen
+from src.seedgen import Seedgen, enable_seed_pool, enable_hash_cache, preset_registry, configure_generation
 from src.util import Util
 from src.racing import AsyncRace
 from src.memes import Memes
-from src.tourney import Tourney
-from src.archipelago import Archipelago
+from src.tourney import Tourney, TOURNEY_PRESETS
+from src.archipelago import Archipelago, ENDPOINT
+from src.db_utils import db_pool, configure_storage
+from src.http_client import http_client
+from src.metrics import metrics, MetricsServer, METRICS_PORT
+from src.profiler import SlowCommandProfiler, THRESHOLD, MAX_DUMPS
+from src.log_setup import setup_logging
+from src.errors import ErrorReplies
 
 import discord
 from discord.ext import commands
 
 class BolasBot(commands.Bot):
+    def __init__(self, *args, services=(), profiler=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.services = services     # Tareas en segundo plano con métodos start() y stop()
+        self.profiler = profiler
+        self.error_replies = ErrorReplies()
+        self.instrument_http()
+
+    def instrument_http(self):
+        # Todas las llamadas a la API de Discord pasan por HTTPClient.request
+        request = self.http.request
+
+        async def timed_request(route, **kwargs):
+            with metrics.timer("discord_api", method=route.method, path=route.path):
+                return await request(route, **kwargs)
+        self.http.request = timed_request
+
+    async def invoke(self, ctx):
+        if self.profiler and ctx.command:
+            await self.profiler.run(ctx.command.qualified_name, super().invoke(ctx))
+        else:
+            await super().invoke(ctx)
+
+    async def on_command(self, ctx):
+        ctx.started = time.perf_counter()
+
+    async def on_command_completion(self, ctx):
+        metrics.observe("command", time.perf_counter() - ctx.started, command=ctx.command.qualified_name)
+
+    async def on_command_error(self, ctx, error):
+        # Todas las respuestas de error se envían desde aquí, con límite de frecuencia por usuario y por canal
+        if not ctx.command:
+            return
+        metrics.inc("command_errors", command=ctx.command.qualified_name)
+        await self.error_replies.send(ctx, error)
+
     async def on_ready(self):
         print('Logged in as {0}!'.format(self.user))
+        for service in self.services:
+            service.start()
+
+    async def close(self):
+        for service in self.services:
+            service.stop()
+        await super().close()
+        await http_client.close()
+        db_pool.close_all()
 
 
 if __name__ == "__main__":
-    Path('log').mkdir(parents=True, exist_ok=True)
-    logger = logging.getLogger('discord')
-    handler = logging.FileHandler(filename="log/discord.log", encoding="utf-8", mode="w")
-    handler.setFormatter(logging.Formatter('%(asctime)s:%(levelname)s:%(name)s: %(message)s'))
-    logger.addHandler(handler)
+    config = ConfigParser()
+    config.read('config.ini')
+    log_listener = setup_logging(config['logging'] if config.has_section('logging') else None,
+                                 config['loglevels'] if config.has_section('loglevels') else None)
 
     intents = discord.Intents.default()
     intents.members = True
-    config = ConfigParser()
-    config.read('config.ini')
-    bot = BolasBot(command_prefix=config['commands']['prefix'], intents=intents)
+    if config.has_section('storage'):
+        configure_storage(config['storage'])
+    if config.has_section('generation'):
+        configure_generation(config['generation'])
+
+    Path('data').mkdir(parents=True, exist_ok=True)
+
+    services = [preset_registry]
+    if config.getboolean('hashcache', 'enabled', fallback=True):
+        services.append(enable_hash_cache(config.getfloat('hashcache', 'ttl_days', fallback=30),
+                                          config.getint('hashcache', 'max_entries', fallback=200)))
+    pool_depth = config.getint('seedpool', 'depth', fallback=0)
+    if pool_depth > 0:
+        services.append(enable_seed_pool(TOURNEY_PRESETS, pool_depth))
+    if config.getboolean('metrics', 'enabled', fallback=True):
+        services.append(MetricsServer(metrics, port=config.getint('metrics', 'port', fallback=METRICS_PORT)))
+
+    profiler = None
+    if config.getboolean('profiling', 'enabled', fallback=False):
+        profiler = SlowCommandProfiler(config.getfloat('profiling', 'threshold', fallback=THRESHOLD),
+                                       max_dumps=config.getint('profiling', 'max_dumps', fallback=MAX_DUMPS))
+
+    bot = BolasBot(command_prefix=config['commands']['prefix'], intents=intents, services=services, profiler=profiler)
     bot.add_cog(Seedgen(bot))
     bot.add_cog(Util(bot))
-    bot.add_cog(AsyncRace(bot))
+    bot.add_cog(AsyncRace(bot, results_interval=config.getfloat('racing', 'results_interval', fallback=5)))
     bot.add_cog(Memes(bot))
     bot.add_cog(Tourney(bot))
-    bot.add_cog(Archipelago(bot))
-
-    Path('data').mkdir(parents=True, exist_ok=True)
+    bot.add_cog(Archipelago(bot, endpoint=config.get('archipelago', 'endpoint', fallback=ENDPOINT)))
 
-    bot.run(config['auth']['token'])
\ No newline at end of file
+    try:
+        bot.run(config['auth']['token'])
+    finally:
+        log_listener.stop()
\ No newline at end of file
@@ -1,18 +1,19 @@
-from random import randint
-
-import requests
-
-import discord
+import logging
 
 from discord.ext import commands
+
+from src.http_client import http_client, HTTPError
     
 
+logger = logging.getLogger(__name__)
+
 ENDPOINT = "https://archipelago.gg/api/generate"
 
 
 class Archipelago(commands.Cog):
-    def __init__(self, bot):
+    def __init__(self, bot, endpoint=ENDPOINT):
         self.bot = bot
+        self.endpoint = endpoint
     
     @commands.command(aliases=["multi"])
     async def multiworld(self, ctx, *options):
@@ -41,20 +42,16 @@ class Archipelago(commands.Cog):
             if options and "spoiler" in options:
                 payload["race"] = 0
 
-            r = requests.post(ENDPOINT, data=payload, files=sent_file)
+            try:
+                status, response = await http_client.post_form(self.endpoint, fields=payload, files=sent_file)
+            except HTTPError as e:
+                logger.warning("No se pudo crear la partida de multiworld: %s", e)
+                raise commands.errors.CommandInvokeError("No se ha podido contactar con Archipelago. Inténtalo de nuevo más tarde.")
 
-            if r.status_code == 201:
-                game_url = eval(r.text)["url"]
+            if status == 201 and response and "url" in response:
+                game_url = response["url"]
+                logger.info("Partida de multiworld creada por %s: %s", ctx.author, game_url)
                 await ctx.reply(f"Partida de multiworld creada en: {game_url}", mention_author = False)
             else:
-                raise commands.errors.CommandInvokeError("Error al generar la partida. Revisa que los ajustes de los jugadores sean válidos.")
-
-
-    @multiworld.error
-    async def multiworld_error(self, ctx, error):
-        error_mes = "Se ha producido un error."
-        if type(error) == commands.errors.CommandInvokeError:
-            error_mes = error.original
-
-        err_file = discord.File("res/almeida{}.png".format(randint(0, 3)))
-        await ctx.reply(error_mes, mention_author=False, file=err_file)
\ No newline at end of file
+                logger.info("Archipelago no ha creado la partida (%s): %s", status, response)
+                raise commands.errors.CommandInvokeError("Error al generar la partida. Revisa que los ajustes de los jugadores sean válidos.")
\ No newline at end of file
@@ -0,0 +1,55 @@
+from hashlib import sha256
+from io import BytesIO
+from pathlib import Path
+from random import randint
+
+import discord
+
+from src.metrics import metrics
+
+
+ASSETS_DIR = "res"
+PRELOAD = "almeida*.png"
+
+
+class AssetCache:
+    """
+    Imágenes de res/ cargadas en memoria, para enviarlas sin leer el disco en cada respuesta.
+
+    Cada fichero se guarda una sola vez aunque esté repetido con otro nombre. Cada envío recibe su propio BytesIO sobre
+    los mismos bytes, que no se copian mientras nadie escriba en él.
+    """
+    def __init__(self, assets_dir=ASSETS_DIR, preload=PRELOAD):
+        self.assets_dir = Path(assets_dir)
+        self.blobs = {}     # sha256 -> contenido
+        self.names = {}     # nombre de fichero -> sha256
+        self.hits = 0
+        self.misses = 0
+        for path in sorted(self.assets_dir.glob(preload)):
+            self.load(path.name)
+
+    def load(self, name):
+        content = (self.assets_dir / name).read_bytes()
+        digest = sha256(content).digest()
+        self.names[name] = digest
+        return self.blobs.setdefault(digest, content)
+
+    def get(self, name):
+        digest = self.names.get(name)
+        if digest:
+            self.hits += 1
+            metrics.inc("assets", result="hit")
+            return self.blobs[digest]
+        self.misses += 1
+        metrics.inc("assets", result="miss")
+        return self.load(name)
+
+    def file(self, name, **kwargs):
+        return discord.File(BytesIO(self.get(name)), filename=name, **kwargs)
+
+
+assets = AssetCache()
+
+
+def almeida_file(max_index=3):
+    return assets.file("almeida{}.png".format(randint(0, max_index)))
@@ -0,0 +1,48 @@
+import asyncio
+import logging
+import time
+
+
+logger = logging.getLogger(__name__)
+
+INTERVAL = 0.8
+MAX_COUNT = 10
+
+
+async def run_countdown(send, count, interval=INTERVAL, edit=None, clock=time.monotonic, sleep=asyncio.sleep):
+    """
+    Envía una cuenta atrás desde count hasta "GO!", un número cada interval segundos.
+
+    Cada número tiene un instante objetivo fijo, medido desde el inicio, así que el retraso de un envío no se acumula en
+    los siguientes. Además, cada envío se adelanta lo que se estima que tarda en llegar, según la media de los envíos
+    anteriores. send(texto) envía un mensaje y lo devuelve; si se da edit(mensaje, texto), solo se envía el primer
+    número y los demás se escriben editando ese mensaje.
+
+    La espera se hace dentro de la propia tarea del comando, así que varias cuentas atrás simultáneas no necesitan
+    tareas adicionales. Devuelve, para cada número, el retraso con que llegó respecto a su instante objetivo.
+    """
+    ticks = [str(i) for i in range(count, 0, -1)] + ["GO!"]
+    start = clock()
+    latency = 0
+    lateness = []
+    message = None
+
+    for k, text in enumerate(ticks):
+        deadline = start + k * interval
+        delay = deadline - latency - clock()
+        if delay > 0:
+            await sleep(delay)
+
+        sent_at = clock()
+        if edit and message:
+            await edit(message, text)
+        else:
+            message = await send(text)
+        arrived = clock()
+
+        # Media móvil del tiempo de envío, con más peso para los envíos recientes
+        latency = arrived - sent_at if k == 0 else (latency + arrived - sent_at) / 2
+        lateness.append(arrived - deadline)
+
+    logger.debug("Cuenta atrás de %d: retraso máximo %.3f s", count, max(lateness))
+    return lateness
@@ -1,12 +1,142 @@
 from pathlib import Path
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 import asyncio
+import re
 
 import sqlite3
 
-write_lock = asyncio.Lock()
+from src.metrics import metrics
+
+MAX_OPEN_DBS = 32
+HISTORY_PAGE_SIZE = 10
+FORFEIT_TIME = 359999
+
+# Resumen de una carrera para el historial. Los tiempos de 99:59:59 (359999 s) son forfeits.
+ASYNC_SUMMARY = '''SELECT AsyncRaces.Id, AsyncRaces.Name, AsyncRaces.Preset, {description}, AsyncRaces.StartDate,
+                    AsyncRaces.EndDate, AsyncRaces.SeedUrl, AsyncRaces.SeedCode,
+                    (SELECT COUNT(*) FROM AsyncResults WHERE Race = AsyncRaces.Id),
+                    (SELECT COUNT(*) FROM AsyncResults WHERE Race = AsyncRaces.Id AND Time < 359999),
+                    (SELECT Players.Name FROM AsyncResults JOIN Players ON Players.DiscordId = AsyncResults.Player
+                     WHERE Race = AsyncRaces.Id AND Time < 359999 ORDER BY Time, Timestamp LIMIT 1),
+                    (SELECT MIN(Time) FROM AsyncResults WHERE Race = AsyncRaces.Id AND Time < 359999)
+                FROM AsyncRaces'''
+
+# Estadísticas de los jugadores calculadas desde cero a partir de AsyncResults
+PLAYER_STATS_BACKFILL = '''INSERT OR IGNORE INTO PlayerResults
+        SELECT AsyncResults.Race, AsyncResults.Player, COALESCE(AsyncRaces.PresetName, ''), AsyncResults.Time FROM AsyncResults
+        JOIN AsyncRaces ON AsyncRaces.Id = AsyncResults.Race WHERE AsyncResults.Player IS NOT NULL;
+    INSERT OR IGNORE INTO PlayerStats
+        SELECT AsyncResults.Player, COALESCE(AsyncRaces.PresetName, ''), COUNT(*), SUM(AsyncResults.Time >= 359999),
+            MIN(CASE WHEN AsyncResults.Time < 359999 THEN AsyncResults.Time END),
+            SUM(CASE WHEN AsyncResults.Time < 359999 THEN AsyncResults.CollectionRate ELSE 0 END)
+        FROM AsyncResults JOIN AsyncRaces ON AsyncRaces.Id = AsyncResults.Race
+        WHERE AsyncResults.Player IS NOT NULL GROUP BY AsyncResults.Player, COALESCE(AsyncRaces.PresetName, '');'''
+
+# Perfil de almacenamiento: PRAGMAs que se aplican a cada conexión abierta. Pueden sobrescribirse
+# desde la sección [storage] de config.ini.
+STORAGE_PROFILE = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": "67108864",
+    "cache_size": "-16000",
+    "busy_timeout": "5000"
+}
+
+# Migraciones del esquema. La migración en la posición i lleva la base de datos de la versión i a la i + 1
+# (PRAGMA user_version). Solo se pueden añadir migraciones nuevas al final de la lista.
+MIGRATIONS = [
+    # 1: índices para las búsquedas de cada comando
+    '''CREATE INDEX IF NOT EXISTS AsyncRacesSubmitChannel ON AsyncRaces(SubmitChannel);
+    CREATE INDEX IF NOT EXISTS AsyncRacesStatus ON AsyncRaces(Status);
+    CREATE INDEX IF NOT EXISTS PrivateRacesPrivateChannel ON PrivateRaces(PrivateChannel);
+    CREATE INDEX IF NOT EXISTS PrivateRacesStatus ON PrivateRaces(Status);
+    CREATE INDEX IF NOT EXISTS AsyncResultsRanking ON AsyncResults(Race, Time, Timestamp, Player, CollectionRate);''',
+
+    # 2: historial de carreras purgadas, con una fila de resumen por carrera e índice de texto completo
+    '''CREATE TABLE IF NOT EXISTS AsyncHistory (
+        Race INTEGER NOT NULL PRIMARY KEY REFERENCES AsyncRaces(Id) ON DELETE CASCADE,
+        Name TEXT NOT NULL,
+        Preset TEXT,
+        Description TEXT,
+        StartDate TEXT NOT NULL,
+        EndDate TEXT,
+        SeedUrl TEXT,
+        SeedCode TEXT,
+        Players INTEGER NOT NULL DEFAULT 0,
+        Finished INTEGER NOT NULL DEFAULT 0,
+        Winner TEXT,
+        WinnerTime INTEGER);
+    CREATE INDEX IF NOT EXISTS AsyncHistoryStartDate ON AsyncHistory(StartDate);
+    CREATE VIRTUAL TABLE IF NOT EXISTS AsyncHistorySearch USING fts5(Name, Preset, Description,
+        content='AsyncHistory', content_rowid='Race', tokenize='unicode61 remove_diacritics 2');
+    CREATE TRIGGER IF NOT EXISTS AsyncHistoryInsert AFTER INSERT ON AsyncHistory BEGIN
+        INSERT INTO AsyncHistorySearch(rowid, Name, Preset, Description) VALUES (new.Race, new.Name, new.Preset, new.Description);
+    END;
+    CREATE TRIGGER IF NOT EXISTS AsyncHistoryDelete AFTER DELETE ON AsyncHistory BEGIN
+        INSERT INTO AsyncHistorySearch(AsyncHistorySearch, rowid, Name, Preset, Description)
+        VALUES ('delete', old.Race, old.Name, old.Preset, old.Description);
+    END;
+    CREATE TRIGGER IF NOT EXISTS AsyncHistoryUpdate AFTER UPDATE ON AsyncHistory BEGIN
+        INSERT INTO AsyncHistorySearch(AsyncHistorySearch, rowid, Name, Preset, Description)
+        VALUES ('delete', old.Race, old.Name, old.Preset, old.Description);
+        INSERT INTO AsyncHistorySearch(rowid, Name, Preset, Description) VALUES (new.Race, new.Name, new.Preset, new.Description);
+    END;
+    INSERT OR IGNORE INTO AsyncHistory ''' + ASYNC_SUMMARY.format(description="NULL") + ''' WHERE AsyncRaces.Status = 2;''',
+
+    # 3: estadísticas de cada jugador por preset, que save_async_result mantiene al registrar cada resultado.
+    # El preset es el del registro, que asyncstart guarda en AsyncRaces.PresetName: AsyncRaces.Preset es texto libre.
+    # Las carreras anteriores no lo tienen y sus resultados se agrupan bajo "".
+    # PlayerResults guarda los tiempos ordenados por jugador y preset, para calcular medianas sin recorrer AsyncResults.
+    '''ALTER TABLE AsyncRaces ADD COLUMN PresetName TEXT;
+    CREATE TABLE IF NOT EXISTS PlayerResults (
+        Race INTEGER NOT NULL,
+        Player INTEGER NOT NULL,
+        Preset TEXT NOT NULL,
+        Time INTEGER NOT NULL,
+        PRIMARY KEY (Race, Player));
+    CREATE INDEX IF NOT EXISTS PlayerResultsTimes ON PlayerResults(Player, Preset, Time);
+    CREATE TABLE IF NOT EXISTS PlayerStats (
+        Player INTEGER NOT NULL,
+        Preset TEXT NOT NULL,
+        Races INTEGER NOT NULL DEFAULT 0,
+        Forfeits INTEGER NOT NULL DEFAULT 0,
+        BestTime INTEGER,
+        TotalCollection INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (Player, Preset));
+    CREATE INDEX IF NOT EXISTS PlayerStatsRanking ON PlayerStats(Preset, BestTime);
+    ''' + PLAYER_STATS_BACKFILL,
+]
+
+
+def migrate_db(db_conn):
+    version = db_conn.execute("PRAGMA user_version").fetchone()[0]
+    for new_version in range(version + 1, len(MIGRATIONS) + 1):
+        try:
+            db_conn.executescript("BEGIN;\n{}\nPRAGMA user_version = {};\nCOMMIT;".format(MIGRATIONS[new_version - 1], new_version))
+        except:
+            db_conn.rollback()
+            raise
+
+
+def configure_storage(settings):
+    for pragma, value in settings.items():
+        if pragma not in STORAGE_PROFILE:
+            raise ValueError("PRAGMA no soportado en el perfil de almacenamiento: {}".format(pragma))
+        if not re.match(r'-?\w+$', value):
+            raise ValueError("Valor inválido para {}: {}".format(pragma, value))
+        STORAGE_PROFILE[pragma] = value
+
+
+def apply_storage_profile(db_conn):
+    for pragma, value in STORAGE_PROFILE.items():
+        db_conn.execute("PRAGMA {} = {}".format(pragma, value))
+
 
 def init_db(db_name, server):
     mydb = sqlite3.connect(db_name)
+    apply_storage_profile(mydb)
     cur = mydb.cursor()
 
     cur.execute('''CREATE TABLE IF NOT EXISTS GlobalVar (
@@ -58,6 +188,7 @@ def init_db(db_name, server):
                 PrivateChannel INT NOT NULL)''')
 
     mydb.commit()
+    migrate_db(mydb)
 
     return (mydb, cur)
 
@@ -68,6 +199,8 @@ def open_db(server):
         return init_db(my_db, server)
 
     db_conn = sqlite3.connect(my_db)
+    apply_storage_profile(db_conn)
+    migrate_db(db_conn)
     db_cur = db_conn.cursor()
     return (db_conn, db_cur)
 
@@ -80,6 +213,120 @@ def close_db(db_conn):
     db_conn.close()
 
 
+class GuildDB:
+    """
+    Acceso asíncrono a la base de datos de un servidor.
+
+    Cada servidor tiene su propio hilo de ejecución, que actúa como cola de escritura única para su base
+    de datos: las consultas no bloquean el bucle de eventos del bot, y las escrituras de un servidor no
+    esperan a las de otro. La conexión se abre en ese mismo hilo la primera vez que se usa.
+    """
+    def __init__(self, server):
+        self.server = server
+        self.db_conn = None
+        self.users = 0
+        self.write_lock = asyncio.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-{}".format(server))
+
+    def connection(self):
+        if not self.db_conn:
+            self.db_conn, _ = open_db(self.server)
+        return self.db_conn
+
+    def run_read(self, func, args):
+        return func(self.connection().cursor(), *args)
+
+    def run_write(self, calls):
+        # Todas las llamadas se aplican en una única transacción
+        db_conn = self.connection()
+        try:
+            db_cur = db_conn.cursor()
+            results = [func(db_cur, *args) for func, *args in calls]
+            commit_db(db_conn)
+        except:
+            db_conn.rollback()
+            raise
+        return results
+
+    def run_close(self):
+        if self.db_conn:
+            close_db(self.db_conn)
+            self.db_conn = None
+
+    async def read(self, func, *args):
+        with metrics.timer("db_read", query=func.__name__):
+            return await asyncio.get_running_loop().run_in_executor(self.executor, self.run_read, func, args)
+
+    async def write(self, func, *args):
+        return (await self.write_many((func, ) + args))[0]
+
+    async def write_many(self, *calls):
+        """
+        Ejecuta varias escrituras en una sola transacción: o se aplican todas o ninguna.
+
+        Cada llamada es una tupla (función, argumentos...). Devuelve la lista de resultados.
+        """
+        with metrics.timer("db_write", query="+".join(call[0].__name__ for call in calls)):
+            return await asyncio.get_running_loop().run_in_executor(self.executor, self.run_write, calls)
+
+    def close(self, wait=False):
+        self.executor.submit(self.run_close)
+        self.executor.shutdown(wait=wait)
+
+
+class DBPool:
+    """
+    Conexiones persistentes a las bases de datos de cada servidor.
+
+    Se mantienen abiertas como máximo max_size conexiones. Al superarse el límite, se cierran las
+    menos usadas recientemente que no estén en uso por ningún comando.
+    """
+    def __init__(self, max_size=MAX_OPEN_DBS):
+        self.max_size = max_size
+        self.connections = OrderedDict()    # server -> GuildDB
+
+    def acquire(self, server):
+        guild = self.connections.get(server)
+        if guild:
+            self.connections.move_to_end(server)
+        else:
+            guild = GuildDB(server)
+            self.connections[server] = guild
+        guild.users += 1
+        self.evict()
+        return guild
+
+    def release(self, guild):
+        guild.users -= 1
+        self.evict()
+
+    def evict(self):
+        for server in list(self.connections):
+            if len(self.connections) <= self.max_size:
+                break
+            guild = self.connections[server]
+            if guild.users == 0:
+                guild.close()
+                del self.connections[server]
+
+    def close_all(self):
+        for guild in self.connections.values():
+            guild.close(wait=True)
+        self.connections.clear()
+
+
+db_pool = DBPool()
+
+
+@asynccontextmanager
+async def guild_db(server):
+    guild = db_pool.acquire(server)
+    try:
+        yield guild
+    finally:
+        db_pool.release(guild)
+
+
 def get_player_by_id(db_cur, discord_id):
     db_cur.execute("SELECT * FROM Players WHERE DiscordId = ?", (discord_id, ))
     return db_cur.fetchone()
@@ -91,11 +338,15 @@ def insert_player_if_not_exists(db_cur, discord_id, name, discriminator, mention
                     discriminator, mention))
 
 
-def insert_async(db_cur, name, creator, preset, seed_hash, seed_code, seed_url, role_id, submit_channel, results_channel, results_message, spoilers_channel):
+def insert_player(db_cur, member):
+    insert_player_if_not_exists(db_cur, member.id, member.name, member.discriminator, member.mention)
+
+
+def insert_async(db_cur, name, creator, preset, seed_hash, seed_code, seed_url, role_id, submit_channel, results_channel, results_message, spoilers_channel, preset_name=None):
     db_cur.execute('''INSERT INTO AsyncRaces(Name, Creator, StartDate, EndDate, Status, Preset, SeedHash, SeedCode, SeedUrl, 
-                   RoleId, SubmitChannel, ResultsChannel, ResultsMessage, SpoilersChannel) 
-                   VALUES (?, ?, datetime('now'), NULL, 0, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                   (name, creator, preset, seed_hash, seed_code, seed_url, role_id, submit_channel, results_channel, results_message, spoilers_channel))
+                   RoleId, SubmitChannel, ResultsChannel, ResultsMessage, SpoilersChannel, PresetName) 
+                   VALUES (?, ?, datetime('now'), NULL, 0, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                   (name, creator, preset, seed_hash, seed_code, seed_url, role_id, submit_channel, results_channel, results_message, spoilers_channel, preset_name))
 
 
 def get_active_async_races(db_cur):
@@ -120,16 +371,96 @@ def update_async_status(db_cur, id, status):
 
 
 def save_async_result(db_cur, race, player, time, collection_rate):
+    old = db_cur.execute("SELECT Time, CollectionRate FROM AsyncResults WHERE Race = ? AND Player = ?", (race, player)).fetchone()
     db_cur.execute('''REPLACE INTO AsyncResults(Race, Player, Timestamp, Time, CollectionRate)
                    VALUES (?, ?, datetime('now'), ?, ?)''', (race, player, time, collection_rate))
+    update_player_stats(db_cur, race, player, old, (time, collection_rate))
+
+
+def update_player_stats(db_cur, race, player, old, new):
+    # Se resta el resultado anterior del jugador en la carrera, si lo había, y se suma el nuevo
+    preset = db_cur.execute("SELECT COALESCE(PresetName, '') FROM AsyncRaces WHERE Id = ?", (race, )).fetchone()[0]
+    races = 1
+    forfeits = int(new[0] >= FORFEIT_TIME)
+    collection = new[1] if new[0] < FORFEIT_TIME else 0
+    if old:
+        races -= 1
+        forfeits -= int(old[0] >= FORFEIT_TIME)
+        collection -= old[1] if old[0] < FORFEIT_TIME else 0
+
+    db_cur.execute("REPLACE INTO PlayerResults (Race, Player, Preset, Time) VALUES (?, ?, ?, ?)", (race, player, preset, new[0]))
+    db_cur.execute('''INSERT INTO PlayerStats (Player, Preset, Races, Forfeits, TotalCollection) VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT(Player, Preset) DO UPDATE SET Races = Races + excluded.Races,
+                   Forfeits = Forfeits + excluded.Forfeits, TotalCollection = TotalCollection + excluded.TotalCollection''',
+                   (player, preset, races, forfeits, collection))
+    db_cur.execute('''UPDATE PlayerStats SET BestTime = (SELECT MIN(Time) FROM PlayerResults
+                   WHERE Player = ? AND Preset = ? AND Time < ?) WHERE Player = ? AND Preset = ?''',
+                   (player, preset, FORFEIT_TIME, player, preset))
+
+
+def get_player_stats(db_cur, player):
+    """
+    Estadísticas de un jugador en cada preset: carreras, forfeits, mejor tiempo, mediana y tasa de colección media.
+
+    Los presets son los del registro; las carreras sin preset del registro se agrupan bajo "". La mediana se lee del
+    índice PlayerResultsTimes saltando la mitad de los tiempos del jugador en el preset, así que su coste crece con el
+    número de carreras de ese jugador en ese preset, no con el tamaño total del historial.
+    """
+    db_cur.execute('''SELECT Preset, Races, Forfeits, BestTime, TotalCollection FROM PlayerStats
+                   WHERE Player = ? ORDER BY Races DESC, Preset''', (player, ))
+    stats = []
+    for preset, races, forfeits, best_time, total_collection in db_cur.fetchall():
+        finished = races - forfeits
+        median = None
+        if finished:
+            times = [row[0] for row in db_cur.execute('''SELECT Time FROM PlayerResults WHERE Player = ? AND Preset = ?
+                                                         ORDER BY Time LIMIT ? OFFSET ?''',
+                                                      (player, preset, 2 - finished % 2, (finished - 1) // 2))]
+            median = sum(times) // len(times)
+        stats.append((preset, races, forfeits, best_time, median, total_collection / finished if finished else 0))
+    return stats
+
+
+def get_preset_ranking(db_cur, preset, limit=10):
+    db_cur.execute('''SELECT Players.Name, PlayerStats.BestTime, PlayerStats.Races FROM PlayerStats
+                   JOIN Players ON Players.DiscordId = PlayerStats.Player
+                   WHERE PlayerStats.Preset = ? AND PlayerStats.BestTime IS NOT NULL
+                   ORDER BY PlayerStats.BestTime LIMIT ?''', (preset, limit))
+    return db_cur.fetchall()
+
+
+def archive_async_race(db_cur, race, description):
+    db_cur.execute('''INSERT INTO AsyncHistory ''' + ASYNC_SUMMARY.format(description="?") + ''' WHERE AsyncRaces.Id = ?
+                   ON CONFLICT(Race) DO UPDATE SET Name = excluded.Name, Preset = excluded.Preset,
+                   Description = excluded.Description, EndDate = excluded.EndDate, Players = excluded.Players,
+                   Finished = excluded.Finished, Winner = excluded.Winner, WinnerTime = excluded.WinnerTime''',
+                   (description, race))
+
+
+def history_match(text):
+    # Cada palabra de la búsqueda se busca como prefijo, para que "stand" encuentre "standard"
+    return " ".join('"{}"*'.format(word) for word in re.findall(r'\w+', text))
+
+
+def search_async_history(db_cur, text, page):
+    match = history_match(text)
+    offset = (page - 1) * HISTORY_PAGE_SIZE
+    if match:
+        total = db_cur.execute("SELECT COUNT(*) FROM AsyncHistorySearch WHERE AsyncHistorySearch MATCH ?", (match, )).fetchone()[0]
+        db_cur.execute('''SELECT AsyncHistory.* FROM AsyncHistorySearch
+                       JOIN AsyncHistory ON AsyncHistory.Race = AsyncHistorySearch.rowid
+                       WHERE AsyncHistorySearch MATCH ? ORDER BY rank LIMIT ? OFFSET ?''', (match, HISTORY_PAGE_SIZE, offset))
+    else:
+        total = db_cur.execute("SELECT COUNT(*) FROM AsyncHistory").fetchone()[0]
+        db_cur.execute("SELECT * FROM AsyncHistory ORDER BY StartDate DESC LIMIT ? OFFSET ?", (HISTORY_PAGE_SIZE, offset))
+    return total, db_cur.fetchall()
 
 
-def get_results_for_race(db_cur, submit_channel):
-    db_cur.execute('''SELECT Players.Name, AsyncResults.Time, AsyncResults.CollectionRate FROM AsyncResults
-                   JOIN AsyncRaces ON AsyncRaces.Id = AsyncResults.Race
+def get_leaderboard_for_race(db_cur, race):
+    db_cur.execute('''SELECT AsyncResults.Player, Players.Name, AsyncResults.Time, AsyncResults.CollectionRate, AsyncResults.Timestamp
+                   FROM AsyncResults
                    JOIN Players ON Players.DiscordId = AsyncResults.Player
-                   WHERE AsyncRaces.SubmitChannel = ?
-                   ORDER BY AsyncResults.Time ASC, datetime(AsyncResults.Timestamp) ASC''', (submit_channel, ))
+                   WHERE AsyncResults.Race = ?''', (race, ))
     return db_cur.fetchall()
 
 
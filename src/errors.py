@@ -0,0 +1,130 @@
+import logging
+import time
+
+import discord
+from discord.ext import commands
+
+from src.assets import almeida_file
+from src.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+# Respuestas de error por usuario: ráfaga de 3, y después una cada 20 segundos
+USER_BURST = 3
+USER_RATE = 1 / 20
+# Imágenes de error por canal: ráfaga de 3, y después una cada 10 segundos
+CHANNEL_BURST = 3
+CHANNEL_RATE = 1 / 10
+# Un mismo error repetido por el mismo usuario en este plazo se acumula en la respuesta anterior
+COLLAPSE_WINDOW = 30
+MAX_TRACKED = 1000
+
+ERROR_MESSAGES = {
+    commands.errors.MissingRequiredArgument: "Faltan argumentos para ejecutar el comando.",
+    commands.errors.BadArgument: "Argumentos inválidos.",
+    commands.errors.MissingPermissions: "No tienes permiso para ejecutar este comando.",
+    commands.errors.NotOwner: "No tienes permiso para ejecutar este comando."
+}
+
+
+class TokenBucket:
+    def __init__(self, capacity, rate):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self):
+        self.refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def full(self):
+        self.refill()
+        return self.tokens >= self.capacity
+
+
+def error_message(error):
+    if isinstance(error, commands.errors.CommandInvokeError) and isinstance(error.original, str):
+        return error.original
+    return ERROR_MESSAGES.get(type(error), "Se ha producido un error.")
+
+
+class ErrorReplies:
+    """
+    Respuestas a los errores de los comandos, limitadas para no agotar el límite de peticiones de Discord.
+
+    Cada usuario tiene un cupo de respuestas, y cada canal un cupo de imágenes: sin cupo de respuestas el error se
+    descarta, y sin cupo de imágenes se responde solo con texto. Si un usuario repite el mismo error poco después, en vez
+    de responder otra vez se actualiza la respuesta anterior con el número de repeticiones.
+    """
+    def __init__(self):
+        self.user_buckets = {}
+        self.channel_buckets = {}
+        self.last_replies = {}      # (canal, usuario) -> (texto, repeticiones, mensaje, hora)
+        self.counts = {"sent": 0, "text_only": 0, "collapsed": 0, "suppressed": 0}
+
+    def count(self, result):
+        self.counts[result] += 1
+        metrics.inc("error_replies", result=result)
+
+    def bucket(self, buckets, key, capacity, rate):
+        if key not in buckets:
+            if len(buckets) >= MAX_TRACKED:
+                for old in [k for k, b in buckets.items() if b.full()]:
+                    del buckets[old]
+            buckets[key] = TokenBucket(capacity, rate)
+        return buckets[key]
+
+    async def send(self, ctx, error):
+        if isinstance(error, commands.errors.CommandInvokeError) and not isinstance(error.original, str):
+            logger.error("Error en el comando %s", ctx.command, exc_info=error.original)
+        text = error_message(error)
+        key = (ctx.channel.id, ctx.author.id)
+        now = time.monotonic()
+        user_bucket = self.bucket(self.user_buckets, ctx.author.id, USER_BURST, USER_RATE)
+
+        last = self.last_replies.get(key)
+        if last and last[0] == text and now - last[3] < COLLAPSE_WINDOW:
+            repeats = last[1] + 1
+            self.last_replies[key] = (text, repeats, last[2], now)
+            self.count("collapsed")
+            if user_bucket.take():
+                try:
+                    await last[2].edit(content="{} (x{})".format(text, repeats))
+                except discord.HTTPException:
+                    pass
+            return
+
+        if not user_bucket.take():
+            self.count("suppressed")
+            return
+
+        channel_bucket = self.bucket(self.channel_buckets, ctx.channel.id, CHANNEL_BURST, CHANNEL_RATE)
+        err_file = None
+        if channel_bucket.take():
+            err_file = almeida_file()
+            self.count("sent")
+        else:
+            self.count("text_only")
+
+        try:
+            if getattr(ctx, "message_deleted", False):
+                reply = await ctx.send(text, file=err_file)
+            else:
+                reply = await ctx.reply(text, mention_author=False, file=err_file)
+        except discord.HTTPException as e:
+            logger.warning("No se pudo responder al error del comando %s: %s", ctx.command, e)
+            return
+
+        if len(self.last_replies) >= MAX_TRACKED:
+            self.last_replies = {k: v for k, v in self.last_replies.items() if now - v[3] < COLLAPSE_WINDOW}
+        self.last_replies[key] = (text, 1, reply, now)
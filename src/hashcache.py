@@ -0,0 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import json
+import sqlite3
+import time
+import zlib
+
+from src.db_utils import apply_storage_profile
+
+
+CACHE_DB = "data/hashcache.db"
+TTL_DAYS = 30
+MAX_ENTRIES = 200
+
+
+class HashCache:
+    """
+    Caché en disco de seeds de ALTTPR ya existentes, indexada por hash.
+
+    Guarda los datos de la seed tal y como los devuelve la API (comprimidos), de los que se obtienen sin acceder a la
+    red tanto su código como su spoiler log. Las entradas caducan a los ttl_days días, y si hay más de max_entries se
+    eliminan las usadas hace más tiempo. Las consultas se ejecutan en un hilo propio.
+    """
+    def __init__(self, db_name=CACHE_DB, ttl_days=TTL_DAYS, max_entries=MAX_ENTRIES):
+        self.db_name = db_name
+        self.ttl = ttl_days * 86400
+        self.max_entries = max_entries
+        self.db_conn = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="hashcache")
+        self.hits = 0
+        self.misses = 0
+
+    def connection(self):
+        if not self.db_conn:
+            self.db_conn = sqlite3.connect(self.db_name)
+            apply_storage_profile(self.db_conn)
+            self.db_conn.execute('''CREATE TABLE IF NOT EXISTS Seeds (
+                                    Hash TEXT NOT NULL PRIMARY KEY,
+                                    Data BLOB NOT NULL,
+                                    Created REAL NOT NULL,
+                                    LastUsed REAL NOT NULL)''')
+            self.db_conn.execute("CREATE INDEX IF NOT EXISTS SeedsLastUsed ON Seeds(LastUsed)")
+            self.db_conn.commit()
+        return self.db_conn
+
+    def run_get(self, seed_hash):
+        db_conn = self.connection()
+        now = time.time()
+        row = db_conn.execute("SELECT Data FROM Seeds WHERE Hash = ? AND Created > ?", (seed_hash, now - self.ttl)).fetchone()
+        if not row:
+            return None
+        db_conn.execute("UPDATE Seeds SET LastUsed = ? WHERE Hash = ?", (now, seed_hash))
+        db_conn.commit()
+        return json.loads(zlib.decompress(row[0]))
+
+    def run_put(self, seed_hash, data):
+        db_conn = self.connection()
+        now = time.time()
+        db_conn.execute("REPLACE INTO Seeds (Hash, Data, Created, LastUsed) VALUES (?, ?, ?, ?)",
+                        (seed_hash, zlib.compress(json.dumps(data).encode("utf-8")), now, now))
+        self.run_evict(now)
+
+    def run_evict(self, now=None):
+        db_conn = self.connection()
+        db_conn.execute("DELETE FROM Seeds WHERE Created <= ?", ((now or time.time()) - self.ttl, ))
+        db_conn.execute('''DELETE FROM Seeds WHERE Hash NOT IN
+                        (SELECT Hash FROM Seeds ORDER BY LastUsed DESC LIMIT ?)''', (self.max_entries, ))
+        db_conn.commit()
+
+    def run_close(self):
+        if self.db_conn:
+            self.db_conn.close()
+            self.db_conn = None
+
+    async def get(self, seed_hash):
+        data = await asyncio.get_running_loop().run_in_executor(self.executor, self.run_get, seed_hash)
+        if data:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return data
+
+    async def put(self, seed_hash, data):
+        await asyncio.get_running_loop().run_in_executor(self.executor, self.run_put, seed_hash, data)
+
+    def start(self):
+        self.executor.submit(self.run_evict)
+
+    def stop(self):
+        self.executor.submit(self.run_close)
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,86 @@
+import asyncio
+import json
+import logging
+
+import aiohttp
+
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT = 60
+CONNECT_TIMEOUT = 10
+MAX_CONNECTIONS = 10
+RETRIES = 2
+BACKOFF = 1
+
+
+class HTTPError(Exception):
+    pass
+
+
+class HTTPClient:
+    """
+    Cliente HTTP asíncrono con una sesión compartida por todo el bot.
+
+    La sesión reutiliza conexiones entre peticiones y se crea la primera vez que se usa. Solo se reintentan las
+    peticiones que no han llegado a enviarse porque no se pudo abrir la conexión, hasta retries veces, esperando backoff,
+    2*backoff, 4*backoff... segundos entre intentos. Un POST que ya se ha enviado no se repite nunca, aunque falle por
+    tiempo de espera o el servidor responda con un 5xx, porque podría haberse procesado y se crearía por duplicado.
+    """
+    def __init__(self, timeout=TIMEOUT, connect_timeout=CONNECT_TIMEOUT, retries=RETRIES, backoff=BACKOFF,
+                 max_connections=MAX_CONNECTIONS):
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_connections = max_connections
+        self.session = None
+
+    def get_session(self):
+        if not self.session or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=self.timeout,
+                                                 connector=aiohttp.TCPConnector(limit=self.max_connections))
+        return self.session
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+
+    async def post_form(self, url, fields=None, files=None):
+        """
+        Envía un formulario multipart y devuelve el código de estado y la respuesta decodificada como JSON.
+
+        files es un diccionario nombre -> (nombre de fichero, contenido en bytes). Los ficheros ya están en memoria:
+        discord.py 1.7 solo permite leer los adjuntos enteros, así que no hay un flujo que reenviar.
+        """
+        for attempt in range(self.retries + 1):
+            form = aiohttp.FormData()
+            for name, value in (fields or {}).items():
+                form.add_field(name, str(value))
+            for name, (filename, content) in (files or {}).items():
+                form.add_field(name, content, filename=filename, content_type="application/octet-stream")
+
+            try:
+                async with self.get_session().post(url, data=form) as resp:
+                    body = await resp.text()
+                    if resp.status >= 500:
+                        logger.warning("POST %s: error %d", url, resp.status)
+                    return resp.status, self.decode(body)
+            except aiohttp.ClientConnectorError as e:
+                if attempt == self.retries:
+                    raise HTTPError("POST {}: {}".format(url, e)) from e
+                logger.warning("POST %s: %s (intento %d)", url, e, attempt + 1)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise HTTPError("POST {}: {}".format(url, str(e) or "tiempo de espera agotado")) from e
+
+            await asyncio.sleep(self.backoff * 2 ** attempt)
+
+    def decode(self, body):
+        if not body:
+            return None
+        try:
+            return json.loads(body)
+        except ValueError:
+            return None
+
+
+http_client = HTTPClient()
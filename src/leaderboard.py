@@ -0,0 +1,66 @@
+from bisect import bisect_left, insort
+
+
+TABLE_BORDER = "+" + "-"*41 + "+\n"
+TABLE_HEADER = "| Rk | Jugador           | Tiempo   | CR  |\n"
+TABLE_SEPARATOR = "|" + "-" * 41 + "|\n"
+
+
+def format_time(time):
+    if time < 359999:
+        m, s = divmod(time, 60)
+        h, m = divmod(m, 60)
+        return "{:02d}:{:02d}:{:02d}".format(h, m, s)
+    return "Forfeit "
+
+
+class Leaderboard:
+    """
+    Clasificación en memoria de una carrera asíncrona.
+
+    Las entradas se mantienen ordenadas por (tiempo, fecha de envío). Cada resultado nuevo se inserta por bisección
+    y solo se regeneran las líneas de la tabla desde la posición que ha cambiado hacia abajo.
+    """
+    def __init__(self, results=()):
+        self.keys = []      # (Time, Timestamp, Player), ordenadas
+        self.bodies = []    # Texto de cada fila sin la posición, en el mismo orden que keys
+        self.lines = []     # Filas completas de la tabla
+        self.players = {}   # Player -> clave en keys
+        for player, name, time, collection_rate, timestamp in results:
+            self.insert(player, name, time, collection_rate, timestamp)
+        self.render_from(0)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def insert(self, player, name, time, collection_rate, timestamp):
+        first_changed = len(self.keys)
+
+        old_key = self.players.pop(player, None)
+        if old_key:
+            first_changed = bisect_left(self.keys, old_key)
+            del self.keys[first_changed]
+            del self.bodies[first_changed]
+
+        key = (time, timestamp, player)
+        insort(self.keys, key)
+        pos = bisect_left(self.keys, key)
+        self.bodies.insert(pos, " {:17s} | {} | {:3d} |\n".format(name[:17], format_time(time), collection_rate))
+        self.players[player] = key
+
+        return min(first_changed, pos)
+
+    def submit(self, player, name, time, collection_rate, timestamp):
+        self.render_from(self.insert(player, name, time, collection_rate, timestamp))
+
+    def render_from(self, pos):
+        del self.lines[pos:]
+        for rank in range(pos, len(self.bodies)):
+            self.lines.append("| {:2d} |{}".format(rank + 1, self.bodies[rank]))
+
+    def render(self):
+        msg = "```\n" + TABLE_BORDER + TABLE_HEADER
+        if self.lines:
+            msg += TABLE_SEPARATOR + "".join(self.lines)
+        msg += TABLE_BORDER + "```"
+        return msg
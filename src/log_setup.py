@@ -0,0 +1,97 @@
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+from pathlib import Path
+from queue import SimpleQueue
+import json
+import logging
+import os
+
+
+LOG_FILE = "log/discord.log"
+LOG_FORMAT = "%(asctime)s:%(levelname)s:%(name)s: %(message)s"
+MAX_BYTES = 10 * 1024 * 1024
+BACKUPS = 7
+
+
+class RotatingLogHandler(TimedRotatingFileHandler):
+    """
+    Fichero de log que rota cada día, o antes si supera max_bytes.
+
+    Los ficheros antiguos llevan la fecha como sufijo, y un número más si se ha rotado varias veces el mismo día. Ese
+    número siempre es mayor que el de cualquier fichero de la misma fecha, aunque se hayan borrado los anteriores, y los
+    ficheros se ordenan por fecha y número para borrar siempre los más antiguos.
+    """
+    def __init__(self, filename, max_bytes=MAX_BYTES, backups=BACKUPS, when="midnight"):
+        super().__init__(filename, when=when, backupCount=backups, encoding="utf-8")
+        self.max_bytes = max_bytes
+        self.namer = self.unique_name
+
+    def shouldRollover(self, record):
+        if self.max_bytes and self.stream and self.stream.tell() >= self.max_bytes:
+            return True
+        return super().shouldRollover(record)
+
+    def rotated_files(self):
+        # Ficheros rotados como (fecha, número, ruta), del más antiguo al más reciente
+        dir_name, base_name = os.path.split(self.baseFilename)
+        prefix = base_name + "."
+        rotated = []
+        for file_name in os.listdir(dir_name):
+            if file_name.startswith(prefix):
+                date, _, number = file_name[len(prefix):].partition(".")
+                if self.extMatch.match(date) and (not number or number.isdigit()):
+                    rotated.append((date, int(number or 0), os.path.join(dir_name, file_name)))
+        return sorted(rotated)
+
+    def unique_name(self, name):
+        numbers = [number for _, number, path in self.rotated_files() if path == name or path.startswith(name + ".")]
+        if not numbers:
+            return name
+        return "{}.{:03d}".format(name, max(numbers) + 1)
+
+    def getFilesToDelete(self):
+        rotated = self.rotated_files()
+        return [path for _, _, path in rotated[:max(0, len(rotated) - self.backupCount)]]
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def setup_logging(settings=None, levels=None):
+    """
+    Envía todos los logs a una cola, de la que un hilo aparte los escribe en el fichero de log.
+
+    Así, escribir un log nunca bloquea el bucle de eventos. settings es la sección [logging] de config.ini, y levels la
+    sección [loglevels], con el nivel de cada logger (por ejemplo, src.racing = DEBUG). Devuelve el QueueListener, que
+    hay que detener al cerrar el bot para escribir los logs pendientes.
+    """
+    settings = settings or {}
+    log_file = Path(settings.get("file", LOG_FILE))
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+
+    handler = RotatingLogHandler(log_file, max_bytes=int(settings.get("max_bytes", MAX_BYTES)),
+                                 backups=int(settings.get("backups", BACKUPS)), when=settings.get("when", "midnight"))
+    if settings.get("format", "text") == "json":
+        handler.setFormatter(JSONFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    queue = SimpleQueue()
+    root = logging.getLogger()
+    root.addHandler(QueueHandler(queue))
+    root.setLevel(settings.get("level", "INFO").upper())
+    for name, level in (levels or {}).items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    listener = QueueListener(queue, handler, respect_handler_level=True)
+    listener.start()
+    return listener
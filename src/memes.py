@@ -1,9 +1,7 @@
-from random import randint
-
-import discord
-
 from discord.ext import commands
 
+from src.assets import almeida_file
+
 
 class Memes(commands.Cog):
     def __init__(self, bot):
@@ -14,10 +12,5 @@ class Memes(commands.Cog):
         """
         Imagen aleatoria de Fernando Almeida.
         """
-        image = discord.File("res/almeida{}.png".format(randint(0, 9)))
-        await ctx.send(file=image)
-    
-    @fernando.error
-    async def fernando_error(self, ctx, error):
-        err_file = discord.File("res/almeida{}.png".format(randint(0, 3)))
-        await ctx.reply("Se ha producido un error.", mention_author=False, file=err_file)
\ No newline at end of file
+        image = almeida_file(9)
+        await ctx.send(file=image)
\ No newline at end of file
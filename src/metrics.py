@@ -0,0 +1,171 @@
+from bisect import bisect_left
+import asyncio
+import logging
+import time
+
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores de los intervalos de los histogramas, en segundos
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        # Estimación por el límite superior del intervalo en que cae el cuantil
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+class Timer:
+    """
+    Mide el tiempo de un bloque de código y lo registra en un histograma. Sirve tanto con with como con async with.
+    """
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        if exc_type:
+            self.metrics.inc(self.name + "_errors", **self.labels)
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.__exit__(exc_type, exc, tb)
+
+
+class Metrics:
+    """
+    Contadores e histogramas de latencia del bot, identificados por nombre y etiquetas.
+
+    Los datos se consultan con summary(), para el comando !botstats, o en formato de texto de Prometheus con render(),
+    que es lo que sirve MetricsServer.
+    """
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if not histogram:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+    def timer(self, name, **labels):
+        return Timer(self, name, labels)
+
+    def summary(self):
+        lines = []
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            lines.append("{}{}: {} llamadas, media {:.1f} ms, p50 {} ms, p95 {} ms".format(
+                name, format_labels(labels), histogram.count, 1000 * histogram.sum / histogram.count,
+                format_bound(histogram.quantile(0.5)), format_bound(histogram.quantile(0.95))))
+        for (name, labels), value in sorted(self.counters.items()):
+            lines.append("{}{}: {}".format(name, format_labels(labels), value))
+        return "\n".join(lines) or "Todavía no hay datos."
+
+    def render(self):
+        lines = []
+        for (name, labels), value in sorted(self.counters.items()):
+            lines.append("bolasbot_{}_total{} {}".format(name, format_labels(labels), value))
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            seen = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                seen += count
+                bucket_labels = labels + (("le", repr(float(bound))), )
+                lines.append("bolasbot_{}_seconds_bucket{} {}".format(name, format_labels(bucket_labels), seen))
+            lines.append("bolasbot_{}_seconds_bucket{} {}".format(name, format_labels(labels + (("le", "+Inf"), )),
+                                                                  histogram.count))
+            lines.append("bolasbot_{}_seconds_sum{} {}".format(name, format_labels(labels), histogram.sum))
+            lines.append("bolasbot_{}_seconds_count{} {}".format(name, format_labels(labels), histogram.count))
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(k, str(v).replace('"', '\\"')) for k, v in labels) + "}"
+
+
+def format_bound(bound):
+    if bound == float("inf"):
+        return ">{:g}".format(1000 * BUCKETS[-1])
+    return "<{:g}".format(1000 * bound)
+
+
+class MetricsServer:
+    """
+    Servidor HTTP mínimo que responde a cualquier petición con las métricas en formato de texto de Prometheus.
+
+    Solo escucha en local: las métricas no deben exponerse fuera de la máquina del bot.
+    """
+    def __init__(self, metrics, host=METRICS_HOST, port=METRICS_PORT):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.server = None
+        self.start_task = None
+
+    def start(self):
+        if not self.start_task:
+            self.start_task = asyncio.create_task(self.serve())
+
+    def stop(self):
+        if self.server:
+            self.server.close()
+        elif self.start_task:
+            self.start_task.cancel()
+
+    async def serve(self):
+        try:
+            self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        except OSError as e:
+            logger.warning("No se pudo abrir el puerto de métricas %s:%d: %s", self.host, self.port, e)
+
+    async def handle(self, reader, writer):
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            body = self.metrics.render().encode("utf-8")
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n")
+            writer.write("Content-Length: {}\r\nConnection: close\r\n\r\n".format(len(body)).encode("ascii"))
+            writer.write(body)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+metrics = Metrics()
@@ -0,0 +1,117 @@
+from collections import Counter
+from itertools import accumulate
+import random
+import time
+
+
+# Claves de los YAML de mystery que no son ajustes
+METADATA_KEYS = ("randomizer", "description", "subweights")
+
+
+def is_weight_table(value):
+    return isinstance(value, dict) and value and all(
+        isinstance(w, (int, float)) and not isinstance(w, bool) for w in value.values())
+
+
+class WeightTable:
+    """
+    Tabla de pesos de un ajuste, con la distribución acumulada precalculada.
+    """
+    def __init__(self, weights):
+        self.values = list(weights)
+        self.cum_weights = list(accumulate(weights.values()))
+        if self.cum_weights[-1] <= 0:
+            raise ValueError("La suma de los pesos debe ser positiva")
+
+    def sample(self, n, rng):
+        return rng.choices(self.values, cum_weights=self.cum_weights, k=n)
+
+
+class MysteryWeights:
+    """
+    Pesos de un YAML de mystery, compilados para generar muchas tiradas de ajustes sin conectarse a ningún servicio.
+
+    Cada ajuste se identifica por su ruta dentro del YAML, como ("customizer", "eq", "PegasusBoots"). Las tiradas se
+    generan por columnas: para cada ajuste se sortean a la vez los valores de todas las tiradas. Los bloques de
+    subweights se sortean primero, y sus ajustes sustituyen a los generales en las tiradas en que salen.
+    """
+    def __init__(self, weights):
+        self.tables = {}
+        self.fixed = {}
+        self.compile(weights, (), self.tables, self.fixed)
+
+        self.subweights = {}
+        subweights = weights.get("subweights") or {}
+        if subweights:
+            self.sub_table = WeightTable({name: sub.get("chance", 0) for name, sub in subweights.items()})
+            for name, sub in subweights.items():
+                tables, fixed = {}, {}
+                self.compile(sub.get("weights") or {}, (), tables, fixed)
+                self.subweights[name] = (tables, fixed)
+
+        # Ajustes cuyo valor puede cambiar de una tirada a otra
+        self.variable = set(self.tables)
+        for tables, fixed in self.subweights.values():
+            self.variable.update(tables, fixed)
+
+    def compile(self, weights, path, tables, fixed):
+        for key, value in weights.items():
+            if not path and key in METADATA_KEYS:
+                continue
+            if is_weight_table(value):
+                tables[path + (key, )] = WeightTable(value)
+            elif isinstance(value, dict) and value:
+                self.compile(value, path + (key, ), tables, fixed)
+            else:
+                fixed[path + (key, )] = value
+
+    def sample_columns(self, n, seed=None):
+        """
+        Genera n tiradas y devuelve, para cada ajuste, la lista de sus n valores.
+
+        Con la misma semilla se obtienen siempre las mismas tiradas.
+        """
+        rng = random.Random(seed)
+        columns = {path: table.sample(n, rng) for path, table in self.tables.items()}
+        for path, value in self.fixed.items():
+            columns[path] = [value] * n
+
+        if self.subweights:
+            rows = {}
+            for i, name in enumerate(self.sub_table.sample(n, rng)):
+                rows.setdefault(name, []).append(i)
+            for name, (tables, fixed) in self.subweights.items():
+                sub_rows = rows.get(name, [])
+                for path, table in tables.items():
+                    column = columns.setdefault(path, [None] * n)
+                    for i, value in zip(sub_rows, table.sample(len(sub_rows), rng)):
+                        column[i] = value
+                for path, value in fixed.items():
+                    column = columns.setdefault(path, [None] * n)
+                    for i in sub_rows:
+                        column[i] = value
+        return columns
+
+    def stats(self, n, seed=None):
+        """
+        Genera n tiradas y devuelve la distribución empírica de cada ajuste que no sea fijo, junto con el tiempo empleado
+        en segundos.
+        """
+        start = time.perf_counter()
+        columns = self.sample_columns(n, seed)
+        stats = {}
+        for path in self.variable:
+            try:
+                stats[path] = Counter(columns[path])
+            except TypeError:
+                stats[path] = Counter(map(str, columns[path]))
+        return stats, time.perf_counter() - start
+
+
+def format_stats(stats, n):
+    lines = []
+    for path, counter in sorted(stats.items(), key=lambda item: [str(key) for key in item[0]]):
+        values = ", ".join("{}: {:.1f}%".format("-" if value is None else value, 100 * count / n)
+                           for value, count in counter.most_common())
+        lines.append("{}: {}".format(".".join(str(key) for key in path), values))
+    return "\n".join(lines)
@@ -0,0 +1,81 @@
+from pathlib import Path
+from collections import namedtuple
+import asyncio
+import logging
+
+import yaml
+
+from src.settings_cache import load_settings
+
+
+logger = logging.getLogger(__name__)
+
+PRESETS_DIR = "rando-settings"
+POLL_INTERVAL = 30
+
+Preset = namedtuple("Preset", ["name", "category", "path", "settings", "description", "mtime"])
+
+
+class PresetRegistry:
+    """
+    Índice en memoria de los presets de PRESETS_DIR.
+
+    Cada preset se lee y se procesa una sola vez. Una tarea en segundo plano comprueba cada POLL_INTERVAL segundos
+    las fechas de modificación de los ficheros, y vuelve a leer solo los que han cambiado.
+
+    Los ajustes de cada preset se comparten entre todas las consultas: quien vaya a modificarlos debe copiarlos antes.
+    """
+    def __init__(self, presets_dir=PRESETS_DIR, poll_interval=POLL_INTERVAL):
+        self.presets_dir = Path(presets_dir)
+        self.poll_interval = poll_interval
+        self.presets = {}
+        self.watch_task = None
+        self.refresh()
+
+    def __contains__(self, name):
+        return name in self.presets
+
+    def get(self, name):
+        return self.presets.get(name)
+
+    def categories(self):
+        categories = {}
+        for preset in sorted(self.presets.values(), key=lambda p: (p.category, p.name)):
+            categories.setdefault(preset.category, []).append(preset.name)
+        return categories
+
+    def load(self, path, mtime):
+        with open(path, "r", encoding="utf-8") as settings_file:
+            settings = load_settings(settings_file.read())
+        return Preset(path.stem, path.parent.name, path, settings, settings.get("description", ""), mtime)
+
+    def refresh(self):
+        presets = {}
+        for path in self.presets_dir.glob("*/*.yaml"):
+            mtime = path.stat().st_mtime
+            old = self.presets.get(path.stem)
+            if old and old.path == path and old.mtime == mtime:
+                presets[path.stem] = old
+                continue
+            try:
+                presets[path.stem] = self.load(path, mtime)
+            except (OSError, yaml.YAMLError) as e:
+                logger.warning("No se pudo cargar el preset %s: %s", path, e)
+        self.presets = presets
+
+    def start(self):
+        if not self.watch_task or self.watch_task.done():
+            self.watch_task = asyncio.create_task(self.watch())
+
+    def stop(self):
+        if self.watch_task:
+            self.watch_task.cancel()
+
+    async def watch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await loop.run_in_executor(None, self.refresh)
+            except OSError as e:
+                logger.warning("Error al actualizar los presets: %s", e)
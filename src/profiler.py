@@ -0,0 +1,79 @@
+from collections import deque
+from pathlib import Path
+import asyncio
+import cProfile
+import logging
+import pstats
+import time
+
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = "log/profiles"
+THRESHOLD = 5
+MAX_DUMPS = 20
+
+
+class SlowCommandProfiler:
+    """
+    Perfila la ejecución de los comandos y guarda el perfil de los que tardan más de threshold segundos.
+
+    cProfile mide todo lo que se ejecuta en el hilo del bot, así que el perfil de un comando incluye también lo que hayan
+    hecho otras tareas mientras tanto. Solo se perfila un comando a la vez: los que empiezan mientras hay otro en curso
+    se ejecutan sin perfilar. En profile_dir se guardan como mucho max_dumps perfiles, borrando los más antiguos.
+    """
+    def __init__(self, threshold=THRESHOLD, profile_dir=PROFILE_DIR, max_dumps=MAX_DUMPS):
+        self.threshold = threshold
+        self.profile_dir = Path(profile_dir)
+        self.max_dumps = max_dumps
+        self.active = False
+        self.dumps = 0
+        self.recent = deque(maxlen=max_dumps)   # (comando, duración, estadísticas) de las últimas ejecuciones lentas
+
+    async def run(self, name, coro):
+        if self.active:
+            return await coro
+
+        self.active = True
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            return await coro
+        finally:
+            profile.disable()
+            self.active = False
+            elapsed = time.perf_counter() - start
+            if elapsed >= self.threshold:
+                self.record(name, elapsed, profile)
+
+    def record(self, name, elapsed, profile):
+        stats = pstats.Stats(profile)
+        self.recent.append((name, elapsed, stats.stats))
+        self.dumps += 1
+        path = self.profile_dir / "{}-{:04d}-{}.prof".format(time.strftime("%Y%m%d-%H%M%S"), self.dumps % 10000,
+                                                             name.replace(" ", "_"))
+        logger.warning("Comando lento: %s (%.1f s), perfil en %s", name, elapsed, path)
+        asyncio.get_running_loop().run_in_executor(None, self.dump, stats, path)
+
+    def dump(self, stats, path):
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        stats.dump_stats(path)
+        for old in sorted(self.profile_dir.glob("*.prof"))[:-self.max_dumps]:
+            old.unlink()
+
+    def summary(self, top=15):
+        if not self.recent:
+            return "No hay ejecuciones lentas recientes."
+
+        # Tiempo propio de cada función sumado entre todas las ejecuciones lentas recientes
+        total = {}
+        for _, _, stats in self.recent:
+            for func, (_, _, own_time, _, _) in stats.items():
+                total[func] = total.get(func, 0) + own_time
+
+        lines = ["{}: {:.1f} s".format(name, elapsed) for name, elapsed, _ in self.recent]
+        lines.append("")
+        for (filename, line, func), own_time in sorted(total.items(), key=lambda item: -item[1])[:top]:
+            lines.append("{:8.3f} s  {} ({}:{})".format(own_time, func, Path(filename).name, line))
+        return "\n".join(lines)
@@ -0,0 +1,75 @@
+import asyncio
+import logging
+from time import perf_counter
+
+
+logger = logging.getLogger(__name__)
+
+
+class Provisioner:
+    """
+    Ejecuta un conjunto de llamadas a la API de Discord respetando sus dependencias.
+
+    Cada paso empieza en cuanto han terminado los pasos de los que depende, de modo que los pasos independientes
+    se ejecutan a la vez. Si algún paso falla, se cancelan los que aún no han empezado, se espera a que terminen los que
+    ya estaban en curso (una petición cancelada puede haber llegado ya a Discord) y se deshacen todos los que se han
+    completado, en orden inverso.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.steps = {}     # nombre -> (función, dependencias, función para deshacer)
+        self.timings = {}   # nombre -> segundos
+
+    def add(self, name, func, deps=(), undo=None):
+        """
+        Añade un paso. func recibe como argumentos los resultados de sus dependencias, en el orden dado, y devuelve
+        una corrutina. undo, si se indica, recibe el resultado del paso y devuelve una corrutina que lo deshace.
+        """
+        for dep in deps:
+            if dep not in self.steps:
+                raise ValueError("Dependencia desconocida: {}".format(dep))
+        self.steps[name] = (func, deps, undo)
+
+    async def run(self):
+        results = {}
+        started = set()
+        completed = []
+        tasks = {}
+
+        async def run_step(name):
+            func, deps, _ = self.steps[name]
+            # shield: cancelar un paso que espera no debe cancelar los pasos de los que depende
+            dep_results = [await asyncio.shield(tasks[dep]) for dep in deps]
+            started.add(name)
+            start = perf_counter()
+            results[name] = await func(*dep_results)
+            self.timings[name] = perf_counter() - start
+            completed.append(name)
+            return results[name]
+
+        start = perf_counter()
+        for name in self.steps:
+            tasks[name] = asyncio.ensure_future(run_step(name))
+
+        try:
+            await asyncio.gather(*tasks.values())
+        except:
+            for name, task in tasks.items():
+                if name not in started:
+                    task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            await self.rollback(completed, results)
+            raise
+
+        elapsed = perf_counter() - start
+        logger.info("%s: %d pasos en %.2f s (%.2f s en secuencia)", self.name, len(self.steps), elapsed, sum(self.timings.values()))
+        return results
+
+    async def rollback(self, completed, results):
+        for name in reversed(completed):
+            undo = self.steps[name][2]
+            if undo:
+                try:
+                    await undo(results[name])
+                except Exception as e:
+                    logger.warning("%s: no se pudo deshacer el paso %s: %s", self.name, name, e)
@@ -1,39 +1,26 @@
+import asyncio
+import logging
 import re
-from random import randint
+from datetime import datetime
+from typing import Optional
 
 import discord
 
 from discord.ext import commands
 
-from src.db_utils import (write_lock, open_db, commit_db, close_db, insert_player_if_not_exists,
+from src.db_utils import (guild_db, insert_player,
     insert_async, get_async_by_submit, get_active_async_races, update_async_status, save_async_result,
-    get_results_for_race, get_player_by_id, get_async_history_channel, set_async_history_channel,
-    get_private_race_by_channel, update_private_status) 
+    get_leaderboard_for_race, get_player_by_id, get_async_history_channel, set_async_history_channel,
+    get_private_race_by_channel, update_private_status, archive_async_race, search_async_history,
+    HISTORY_PAGE_SIZE, get_player_stats, get_preset_ranking) 
 
-from src.seedgen import generate_from_preset, generate_from_hash, generate_from_attachment, is_preset, get_spoiler
+from src.seedgen import generate_from_preset, generate_from_hash, generate_from_attachment, is_preset, get_spoiler, request_origin, preset_registry
+from src.leaderboard import Leaderboard, format_time
+from src.results_updater import ResultsUpdater
+from src.provisioning import Provisioner
 
 
-def get_results_text(db_cur, submit_channel):
-    results = get_results_for_race(db_cur, submit_channel)
-    msg = "```\n"
-    msg += "+" + "-"*41 + "+\n"
-    msg += "| Rk | Jugador           | Tiempo   | CR  |\n"
-    
-    if results:
-        msg += "|" + "-" * 41 + "|\n"
-        pos = 1
-        for res in results:
-            time_str = "Forfeit "
-            if res[1] < 359999:
-                m, s = divmod(res[1], 60)
-                h, m = divmod(m, 60)
-                time_str = "{:02d}:{:02d}:{:02d}".format(h, m, s)
-            msg += "| {:2d} | {:17s} | {} | {:3d} |\n".format(pos, res[0][:17], time_str, res[2])
-            pos += 1
-    
-    msg += "+" + "-"*41 + "+\n"
-    msg += "```"
-    return msg
+logger = logging.getLogger(__name__)
 
 
 def get_async_data(db_cur, submit_channel):
@@ -55,6 +42,61 @@ def get_async_data(db_cur, submit_channel):
     return msg
 
 
+async def create_race_channels(server, name):
+    def results_overwrites(async_role):
+        return {
+            server.default_role: discord.PermissionOverwrite(read_messages=False, send_messages=False),
+            server.me: discord.PermissionOverwrite(read_messages=True, send_messages=True),
+            async_role: discord.PermissionOverwrite(read_messages=True)
+        }
+
+    def spoiler_overwrites(async_role):
+        return {
+            server.default_role: discord.PermissionOverwrite(read_messages=False),
+            server.me: discord.PermissionOverwrite(read_messages=True),
+            async_role: discord.PermissionOverwrite(read_messages=True)
+        }
+
+    def delete(item):
+        return item.delete()
+
+    # El rol y la categoría son independientes; los canales solo esperan a lo que necesitan
+    provisioner = Provisioner("asyncstart")
+    provisioner.add("role", lambda: server.create_role(name=name), undo=delete)
+    provisioner.add("category", lambda: server.create_category_channel(name), undo=delete)
+    provisioner.add("submit", lambda category: server.create_text_channel("{}-submit".format(name), category=category),
+                    deps=["category"], undo=delete)
+    provisioner.add("results", lambda role, category: server.create_text_channel("{}-results".format(name), category=category,
+                    overwrites=results_overwrites(role)), deps=["role", "category"], undo=delete)
+    provisioner.add("spoilers", lambda role, category: server.create_text_channel("{}-spoilers".format(name), category=category,
+                    overwrites=spoiler_overwrites(role)), deps=["role", "category"], undo=delete)
+    provisioner.add("results_msg", lambda results: results.send(Leaderboard().render()), deps=["results"])
+
+    try:
+        return await provisioner.run()
+    except discord.HTTPException:
+        raise commands.errors.CommandInvokeError("No se han podido crear los canales de la carrera.")
+
+
+async def delete_race_channels(guild, race):
+    channels = [guild.get_channel(channel_id) for channel_id in (race[11], race[12], race[14])]
+    category = next((channel.category for channel in channels if channel and channel.category), None)
+
+    # Sin abortar si algo falla: el estado de la carrera ya se ha guardado y la purga no se puede repetir.
+    # Los canales y el rol se eliminan a la vez; la categoría, al final, cuando ya está vacía
+    await delete_items([item for item in channels + [guild.get_role(race[10])] if item])
+    if category:
+        await delete_items([category])
+
+
+async def delete_items(items):
+    results = await asyncio.gather(*[item.delete() for item in items], return_exceptions=True)
+    for item, result in zip(items, results):
+        # NotFound: ya lo había eliminado alguien a mano
+        if isinstance(result, BaseException) and not isinstance(result, discord.NotFound):
+            logger.warning("No se pudo eliminar %s: %s", item, result)
+
+
 def check_race_permissions(ctx, member_id, submit_id):
     auth_permissions = ctx.author.permissions_in(ctx.guild.get_channel(submit_id))
     if auth_permissions.manage_channels or ctx.author.id == member_id:
@@ -66,8 +108,34 @@ def check_race_permissions(ctx, member_id, submit_id):
 
 
 class AsyncRace(commands.Cog):
-    def __init__(self, bot):
+    def __init__(self, bot, results_interval=5):
         self.bot = bot
+        self.results_interval = results_interval
+        self.leaderboards = {}      # (servidor, carrera) -> Leaderboard
+        self.results_updaters = {}  # (servidor, carrera) -> ResultsUpdater
+
+
+    async def get_leaderboard(self, db, race_id):
+        key = (db.server, race_id)
+        if key not in self.leaderboards:
+            self.leaderboards[key] = Leaderboard(await db.read(get_leaderboard_for_race, race_id))
+        return self.leaderboards[key]
+
+
+    def get_results_updater(self, guild, race, leaderboard):
+        key = (guild.id, race[0])
+        if key not in self.results_updaters:
+            results_channel = guild.get_channel(race[12])
+            self.results_updaters[key] = ResultsUpdater(results_channel, race[13], leaderboard, self.results_interval)
+        return self.results_updaters[key]
+
+
+    async def forget_race(self, guild, race_id):
+        key = (guild.id, race_id)
+        self.leaderboards.pop(key, None)
+        updater = self.results_updaters.pop(key, None)
+        if updater:
+            await updater.close()
 
     
     @commands.command(aliases=["async"])
@@ -82,117 +150,87 @@ class AsyncRace(commands.Cog):
 
         Este comando crea aleatoriamente los canales de Discord necesarios para alojar la carrera asíncrona.
         """
-        db_conn, db_cur = open_db(ctx.guild.id)
-
-        # Comprobación de límite: máximo de 10 asíncronas en el servidor
-        asyncs = get_active_async_races(db_cur)
-        if asyncs and len(asyncs) >= 10:
-            close_db(db_conn)
-            raise commands.errors.CommandInvokeError("Demasiadas asíncronas activas en el servidor. Contacta a un moderador para purgar alguna.")
-
-        # Comprobación de nombre válido
-        if re.match(r'https://alttpr\.com/([a-z]{2}/)?h/\w{10}$', name) or is_preset(name):
-            close_db(db_conn)
-            raise commands.errors.CommandInvokeError("El nombre de la carrera no puede ser un preset o una URL de seed.")
+        async with guild_db(ctx.guild.id) as db:
+            # Comprobación de límite: máximo de 10 asíncronas en el servidor
+            asyncs = await db.read(get_active_async_races)
+            if asyncs and len(asyncs) >= 10:
+                raise commands.errors.CommandInvokeError("Demasiadas asíncronas activas en el servidor. Contacta a un moderador para purgar alguna.")
+
+            # Comprobación de nombre válido
+            if re.match(r'https://alttpr\.com/([a-z]{2}/)?h/\w{10}$', name) or is_preset(name):
+                raise commands.errors.CommandInvokeError("El nombre de la carrera no puede ser un preset o una URL de seed.")
         
-        if len(name) > 20:
-            name = name[:20]
-
-        # Crear o procesar seed
-        seed = None
-        seed_hash = None
-        seed_code = None
-        seed_url = None
-        desc = " ".join(preset)
-        spoiler_file = None
-
-        async with ctx.typing():
-            if ctx.message.attachments:
-                attachment = ctx.message.attachments[0]
-                try:
-                    seed = await generate_from_attachment(attachment)
-                except:
-                    close_db(db_conn)
-                    raise commands.errors.CommandInvokeError("Error al generar la seed. Asegúrate de que el YAML introducido sea válido.")
-
-            elif preset:
-                if re.match(r'https://alttpr\.com/([a-z]{2}/)?h/\w{10}$', preset[0]):
-                    seed = await generate_from_hash((preset[0]).split('/')[-1])
-                    if seed:
-                        desc = " ".join(preset[1:])
+            if len(name) > 20:
+                name = name[:20]
+
+            # Crear o procesar seed
+            seed = None
+            seed_hash = None
+            seed_code = None
+            seed_url = None
+            desc = " ".join(preset)
+            preset_name = None
+            spoiler_file = None
+            guild, notify = request_origin(ctx)
+
+            async with ctx.typing():
+                if ctx.message.attachments:
+                    attachment = ctx.message.attachments[0]
+                    try:
+                        seed = await generate_from_attachment(attachment, guild, notify)
+                    except:
+                        logger.warning("Error al generar la seed de la carrera %s desde un YAML", name, exc_info=True)
+                        raise commands.errors.CommandInvokeError("Error al generar la seed. Asegúrate de que el YAML introducido sea válido.")
+
+                elif preset:
+                    if re.match(r'https://alttpr\.com/([a-z]{2}/)?h/\w{10}$', preset[0]):
+                        seed = await generate_from_hash((preset[0]).split('/')[-1], guild, notify)
+                        if seed:
+                            desc = " ".join(preset[1:])
+                    else:
+                        seed = await generate_from_preset(preset, guild=guild, notify=notify)
+                        if seed and is_preset(preset[0]):
+                            preset_name = preset[0]
+
+            if seed:
+                seed_url = seed.url
+                if not hasattr(seed, "randomizer"):     # VARIA
+                    seed_hash = seed.data["seedKey"]
+                elif seed.randomizer in ["sm", "smz3"]:
+                    seed_code = " | ".join(seed.code.split())
+                    seed_hash = seed.slug_id
                 else:
-                    seed = await generate_from_preset(preset)
-
-        if seed:
-            seed_url = seed.url
-            if not hasattr(seed, "randomizer"):     # VARIA
-                seed_hash = seed.data["seedKey"]
-            elif seed.randomizer in ["sm", "smz3"]:
-                seed_code = " | ".join(seed.code.split())
-                seed_hash = seed.slug_id
-            else:
-                seed_code = " | ".join(seed.code)
-                seed_hash = seed.hash
-            spoiler_file = get_spoiler(seed)
+                    seed_code = " | ".join(seed.code)
+                    seed_hash = seed.hash
+                spoiler_file = get_spoiler(seed)
+
+            # Crear canales y rol para la async
+            created = await create_race_channels(ctx.guild, name)
+            async_role = created["role"]
+            submit_channel = created["submit"]
+            results_channel = created["results"]
+            spoilers_channel = created["spoilers"]
+            results_msg = created["results_msg"]
+               
+            creator = ctx.author
+            async with db.write_lock:
+                await db.write_many((insert_player, creator),
+                                    (insert_async, name, creator.id, desc, seed_hash, seed_code, seed_url, async_role.id,
+                                     submit_channel.id, results_channel.id, results_msg.id, spoilers_channel.id, preset_name))
 
-        # Crear canales y rol para la async
+            logger.info("Carrera asíncrona %s abierta en %s por %s", name, ctx.guild, creator)
+            async_data = await db.read(get_async_data, submit_channel.id)
 
-        server = ctx.guild
+            data_msg = await submit_channel.send(async_data, file=spoiler_file)
+            await data_msg.pin()
+            await submit_channel.send("Enviad resultados usando el comando: `!done hh:mm:ss CR`\n"
+                                      "Por ejemplo: `!done 1:40:35 144`, `!done ff` (este último registra un forfeit)\n"
+                                      "Usad preferiblemente tiempo real, no in-game time.\n"
+                                      "Por favor, mantened este canal lo más limpio posible y SIN SPOILERS.")
 
-        async_role = await server.create_role(name=name)
-        res_overwrites = {
-            server.default_role: discord.PermissionOverwrite(read_messages=False, send_messages=False),
-            server.me: discord.PermissionOverwrite(read_messages=True, send_messages=True),
-            async_role: discord.PermissionOverwrite(read_messages=True)
-        }
-        spoiler_overwrites = {
-            server.default_role: discord.PermissionOverwrite(read_messages=False),
-            server.me: discord.PermissionOverwrite(read_messages=True),
-            async_role: discord.PermissionOverwrite(read_messages=True)
-        }
+            text_ans = 'Abierta carrera asíncrona con nombre: {}\nEnvía resultados en {}'.format(name, submit_channel.mention)
 
-        async_category = await server.create_category_channel(name)
-        submit_channel = await server.create_text_channel("{}-submit".format(name), category=async_category)
-        results_channel = await server.create_text_channel("{}-results".format(name), category=async_category, overwrites=res_overwrites)
-        spoilers_channel = await server.create_text_channel("{}-spoilers".format(name), category=async_category, overwrites=spoiler_overwrites)
-
-        results_text = get_results_text(db_cur, submit_channel.id)
-        results_msg = await results_channel.send(results_text)
-               
-        creator = ctx.author
-        async with write_lock:
-            insert_player_if_not_exists(db_cur, creator.id, creator.name, creator.discriminator, creator.mention)
-            insert_async(db_cur, name, creator.id, desc, seed_hash, seed_code, seed_url, async_role.id,
-                     submit_channel.id, results_channel.id, results_msg.id, spoilers_channel.id)
-            commit_db(db_conn)
-
-        async_data = get_async_data(db_cur, submit_channel.id)
-        close_db(db_conn)
-
-        data_msg = await submit_channel.send(async_data, file=spoiler_file)
-        await data_msg.pin()
-        await submit_channel.send("Enviad resultados usando el comando: `!done hh:mm:ss CR`\n"
-                                  "Por ejemplo: `!done 1:40:35 144`, `!done ff` (este último registra un forfeit)\n"
-                                  "Usad preferiblemente tiempo real, no in-game time.\n"
-                                  "Por favor, mantened este canal lo más limpio posible y SIN SPOILERS.")
-
-        text_ans = 'Abierta carrera asíncrona con nombre: {}\nEnvía resultados en {}'.format(name, submit_channel.mention)
-
-        await ctx.reply(text_ans, mention_author=False)
-
-
-    @asyncstart.error
-    async def asyncstart_error(self, ctx, error):
-        error_mes = "Se ha producido un error."
-        if type(error) == commands.errors.MissingRequiredArgument:
-            error_mes = "Faltan argumentos para ejecutar el comando."
-        elif type(error) == commands.errors.BadArgument:
-            error_mes = "Argumentos inválidos."
-        elif type(error) == commands.errors.CommandInvokeError:
-            error_mes = error.original
-        
-        err_file = discord.File("res/almeida{}.png".format(randint(0, 3)))
-        await ctx.reply(error_mes, mention_author=False, file=err_file)  
+            await ctx.reply(text_ans, mention_author=False)
 
 
     ########################################
@@ -208,44 +246,24 @@ class AsyncRace(commands.Cog):
 
         Solo funciona en el canal "submit" asociado a la carrera, y solamente si lo usa el creador original de la carrera o un moderador.
         """
-        db_conn, db_cur = open_db(ctx.guild.id)
+        async with guild_db(ctx.guild.id) as db:
+            race = await db.read(get_async_by_submit, ctx.channel.id)
 
-        race = get_async_by_submit(db_cur, ctx.channel.id)
+            if not race:
+                return
 
-        if not race:
-            close_db(db_conn)
-            return
+            if not check_race_permissions(ctx, race[2], race[11]):
+                raise commands.errors.CommandInvokeError("Esta operación solo puede realizarla el creador original de la carrera o un moderador.")
 
-        if not check_race_permissions(ctx, race[2], race[11]):
-            close_db(db_conn)
-            raise commands.errors.CommandInvokeError("Esta operación solo puede realizarla el creador original de la carrera o un moderador.")
-
-        if race[5] == 0:
-            author = ctx.author
-            async with write_lock:
-                insert_player_if_not_exists(db_cur, author.id, author.name, author.discriminator, author.mention)
-                update_async_status(db_cur, race[0], 1)
-                commit_db(db_conn)
-
-            close_db(db_conn)
-            await ctx.reply("Esta carrera ha sido cerrada.", mention_author=False)
-        else:
-            close_db(db_conn)
-            raise commands.errors.CommandInvokeError("Esta carrera no está abierta.")
+            if race[5] == 0:
+                author = ctx.author
+                async with db.write_lock:
+                    await db.write_many((insert_player, author), (update_async_status, race[0], 1))
+                logger.info("Carrera asíncrona %s cerrada en %s por %s", race[1], ctx.guild, author)
 
-    
-    @end.error
-    async def end_error(self, ctx, error):
-        error_mes = "Se ha producido un error."
-        if type(error) == commands.errors.MissingRequiredArgument:
-            error_mes = "Faltan argumentos para ejecutar el comando."
-        elif type(error) == commands.errors.BadArgument:
-            error_mes = "Argumentos inválidos."
-        elif type(error) == commands.errors.CommandInvokeError:
-            error_mes = error.original
-        
-        err_file = discord.File("res/almeida{}.png".format(randint(0, 3)))
-        await ctx.reply(error_mes, mention_author=False, file=err_file)  
+                await ctx.reply("Esta carrera ha sido cerrada.", mention_author=False)
+            else:
+                raise commands.errors.CommandInvokeError("Esta carrera no está abierta.")
 
 
     ########################################
@@ -261,44 +279,24 @@ class AsyncRace(commands.Cog):
 
         Solo funciona en el canal "submit" asociado a la carrera, y solamente si lo usa el creador original de la carrera o un moderador.
         """
-        db_conn, db_cur = open_db(ctx.guild.id)
-
-        race = get_async_by_submit(db_cur, ctx.channel.id)
-
-        if not race:
-            close_db(db_conn)
-            return
+        async with guild_db(ctx.guild.id) as db:
+            race = await db.read(get_async_by_submit, ctx.channel.id)
 
-        if not check_race_permissions(ctx, race[2], race[11]):
-            close_db(db_conn)
-            raise commands.errors.CommandInvokeError("Esta operación solo puede realizarla el creador original de la carrera o un moderador.")
+            if not race:
+                return
 
-        if race[5] == 1:
-            author = ctx.author
-            async with write_lock:
-                insert_player_if_not_exists(db_cur, author.id, author.name, author.discriminator, author.mention)
-                update_async_status(db_cur, race[0], 0)
-                commit_db(db_conn)
+            if not check_race_permissions(ctx, race[2], race[11]):
+                raise commands.errors.CommandInvokeError("Esta operación solo puede realizarla el creador original de la carrera o un moderador.")
 
-            close_db(db_conn)
-            await ctx.reply("Esta carrera ha sido reabierta.", mention_author=False)
-        else:
-            close_db(db_conn)
-            raise commands.errors.CommandInvokeError("Esta carrera no está cerrada.")
+            if race[5] == 1:
+                author = ctx.author
+                async with db.write_lock:
+                    await db.write_many((insert_player, author), (update_async_status, race[0], 0))
+                logger.info("Carrera asíncrona %s reabierta en %s por %s", race[1], ctx.guild, author)
 
-    
-    @reopen.error
-    async def reopen_error(self, ctx, error):
-        error_mes = "Se ha producido un error."
-        if type(error) == commands.errors.MissingRequiredArgument:
-            error_mes = "Faltan argumentos para ejecutar el comando."
-        elif type(error) == commands.errors.BadArgument:
-            error_mes = "Argumentos inválidos."
-        elif type(error) == commands.errors.CommandInvokeError:
-            error_mes = error.original
-        
-        err_file = discord.File("res/almeida{}.png".format(randint(0, 3)))
-        await ctx.reply(error_mes, mention_author=False, file=err_file)  
+                await ctx.reply("Esta carrera ha sido reabierta.", mention_author=False)
+            else:
+                raise commands.errors.CommandInvokeError("Esta carrera no está cerrada.")
 
 
     ########################################
@@ -316,95 +314,143 @@ class AsyncRace(commands.Cog):
 
         También sirve para eliminar el canal asociado a una carrera privada.
         """
-        db_conn, db_cur = open_db(ctx.guild.id)
+        async with guild_db(ctx.guild.id) as db:
+            race = await db.read(get_async_by_submit, ctx.channel.id)
+
+            if not race:
+                race = await db.read(get_private_race_by_channel, ctx.channel.id)
+                if race:
+                    if check_race_permissions(ctx, race[2], race[5]):
+                        author = ctx.author
+                        async with db.write_lock:
+                            await db.write_many((insert_player, author), (update_private_status, race[0], 2))
+
+                        race_channel = ctx.guild.get_channel(race[5])
+                        await race_channel.delete()
+                        logger.info("Carrera privada %s purgada en %s por %s", race[1], ctx.guild, author)
+                    else:
+                        raise commands.errors.CommandInvokeError("Esta operación solo puede realizarla el creador original de la carrera o un moderador.")
+                return
+
+            if not check_race_permissions(ctx, race[2], race[11]):
+                raise commands.errors.CommandInvokeError("Esta operación solo puede realizarla el creador original de la carrera o un moderador.")
+
+            if race[5] == 1:
+                author = ctx.author
+                preset = preset_registry.get(race[15]) if race[15] else None
+                async with db.write_lock:
+                    await db.write_many((insert_player, author), (update_async_status, race[0], 2),
+                                        (archive_async_race, race[0], preset.description if preset else None))
+
+                # Copia de resultados al historial, si los hay
+                submit_channel = ctx.guild.get_channel(race[11])
+                leaderboard = await self.get_leaderboard(db, race[0])
+                if leaderboard:
+                    history_channel = await db.read(get_async_history_channel)
+                    my_hist_channel = None
+                    if not history_channel[0] or not ctx.guild.get_channel(history_channel[0]):
+                        history_overwrites = {
+                            ctx.guild.default_role: discord.PermissionOverwrite(send_messages=False),
+                            ctx.guild.me: discord.PermissionOverwrite(send_messages=True)
+                        }
+                        my_hist_channel = await ctx.guild.create_text_channel("async-historico", overwrites=history_overwrites)
+                        async with db.write_lock:
+                            await db.write(set_async_history_channel, my_hist_channel.id)
+                    else:
+                        my_hist_channel = ctx.guild.get_channel(history_channel[0])
+
+                    await my_hist_channel.send(await db.read(get_async_data, submit_channel.id))
+                    await my_hist_channel.send(leaderboard.render())
+
+                await self.forget_race(ctx.guild, race[0])
+
+                # Eliminación de roles y canales
+                await delete_race_channels(ctx.guild, race)
+                logger.info("Carrera asíncrona %s purgada en %s por %s", race[1], ctx.guild, author)
 
-        race = get_async_by_submit(db_cur, ctx.channel.id)
+            else:
+                raise commands.errors.CommandInvokeError("La carrera debe cerrarse antes de ser purgada.")
 
-        if not race:
-            race = get_private_race_by_channel(db_cur, ctx.channel.id)
-            if race:
-                if check_race_permissions(ctx, race[2], race[5]):
-                    author = ctx.author
-                    async with write_lock:
-                        insert_player_if_not_exists(db_cur, author.id, author.name, author.discriminator, author.mention)
-                        update_private_status(db_cur, race[0], 2)
-                        commit_db(db_conn)
 
-                    race_channel = ctx.guild.get_channel(race[5])
-                    await race_channel.delete()
-                else:
-                    close_db(db_conn)
-                    raise commands.errors.CommandInvokeError("Esta operación solo puede realizarla el creador original de la carrera o un moderador.")
-            close_db(db_conn)
-            return
-
-        if not check_race_permissions(ctx, race[2], race[11]):
-            close_db(db_conn)
-            raise commands.errors.CommandInvokeError("Esta operación solo puede realizarla el creador original de la carrera o un moderador.")
-
-        if race[5] == 1:
-            author = ctx.author
-            async with write_lock:
-                insert_player_if_not_exists(db_cur, author.id, author.name, author.discriminator, author.mention)
-                update_async_status(db_cur, race[0], 2)
-                commit_db(db_conn)
-
-            # Copia de resultados al historial, si los hay
-            submit_channel = ctx.guild.get_channel(race[11])
-            results = get_results_for_race(db_cur, submit_channel.id)
-            if results:
-                history_channel = get_async_history_channel(db_cur)
-                my_hist_channel = None
-                if not history_channel[0] or not ctx.guild.get_channel(history_channel[0]):
-                    history_overwrites = {
-                        ctx.guild.default_role: discord.PermissionOverwrite(send_messages=False),
-                        ctx.guild.me: discord.PermissionOverwrite(send_messages=True)
-                    }
-                    my_hist_channel = await ctx.guild.create_text_channel("async-historico", overwrites=history_overwrites)
-                    async with write_lock:
-                        set_async_history_channel(db_cur, my_hist_channel.id)
-                        commit_db(db_conn)
-                else:
-                    my_hist_channel = ctx.guild.get_channel(history_channel[0])
+    ########################################
 
-                await my_hist_channel.send(get_async_data(db_cur, submit_channel.id))
-                await my_hist_channel.send(get_results_text(db_cur, submit_channel.id))
 
-            # Eliminación de roles y canales            
+    @commands.command(aliases=["history"])
+    @commands.guild_only()
+    async def historial(self, ctx, pagina: Optional[int]=1, *, busqueda: str=""):
+        """
+        Busca en el historial de carreras asíncronas purgadas.
 
-            async_role = ctx.guild.get_role(race[10])
-            await async_role.delete()
+        Sin parámetros, lista las carreras más recientes. Se puede buscar por nombre, preset o descripción de la carrera,
+        y elegir la página de resultados indicando su número antes de la búsqueda (ejemplo: !historial 2 standard).
+        """
+        pagina = max(pagina, 1)
+        async with guild_db(ctx.guild.id) as db:
+            total, races = await db.read(search_async_history, busqueda, pagina)
 
-            category = submit_channel.category
-            await submit_channel.delete()
+        if not races:
+            raise commands.errors.CommandInvokeError("No se ha encontrado ninguna carrera en el historial.")
 
-            results_channel = ctx.guild.get_channel(race[12])
-            await results_channel.delete()
+        pages = (total + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE
+        msg = "**Historial de asíncronas** ({} carreras, página {} de {})\n".format(total, pagina, pages)
+        for race in races:
+            msg += "\n**{}** ({}) - {}".format(race[1], race[2] or "sin preset", race[4][:10])
+            msg += "\n{} jugadores, {} terminaron".format(race[8], race[9])
+            if race[10]:
+                msg += ". Ganador: {} ({})".format(race[10], format_time(race[11]))
+            if race[6]:
+                msg += "\n<{}>".format(race[6])
+        await ctx.reply(msg[:2000], mention_author=False)
 
-            spoilers_channel = ctx.guild.get_channel(race[14])
-            await spoilers_channel.delete()
 
-            await category.delete()
+    ########################################
 
-            close_db(db_conn)
-        
-        else:
-            close_db(db_conn)
-            raise commands.errors.CommandInvokeError("La carrera debe cerrarse antes de ser purgada.")
-
-
-    @purge.error
-    async def purge_error(self, ctx, error):
-        error_mes = "Se ha producido un error."
-        if type(error) == commands.errors.MissingRequiredArgument:
-            error_mes = "Faltan argumentos para ejecutar el comando."
-        elif type(error) == commands.errors.BadArgument:
-            error_mes = "Argumentos inválidos."
-        elif type(error) == commands.errors.CommandInvokeError:
-            error_mes = error.original
-        
-        err_file = discord.File("res/almeida{}.png".format(randint(0, 3)))
-        await ctx.reply(error_mes, mention_author=False, file=err_file) 
+
+    @commands.command(aliases=["estadisticas"])
+    @commands.guild_only()
+    async def stats(self, ctx, jugador: discord.Member=None):
+        """
+        Estadísticas de un jugador en las carreras asíncronas del servidor.
+
+        Muestra, para cada preset, las carreras jugadas, el mejor tiempo, la mediana, el porcentaje de forfeits y la tasa
+        de colección media. Sin mencionar a nadie, muestra las tuyas.
+        """
+        jugador = jugador or ctx.author
+        async with guild_db(ctx.guild.id) as db:
+            stats = await db.read(get_player_stats, jugador.id)
+
+        if not stats:
+            raise commands.errors.CommandInvokeError("{} no ha jugado ninguna carrera asíncrona.".format(jugador.display_name))
+
+        msg = "**Estadísticas de {}**\n".format(jugador.display_name)
+        for preset, races, forfeits, best_time, median, collection in stats:
+            msg += "\n**{}**: {} carreras, {:.0f}% forfeits".format(preset or "sin preset", races, 100 * forfeits / races)
+            if best_time is not None:
+                msg += ", mejor {}, mediana {}, CR medio {:.0f}".format(format_time(best_time), format_time(median), collection)
+        await ctx.reply(msg[:2000], mention_author=False)
+
+
+    @commands.command()
+    @commands.guild_only()
+    async def ranking(self, ctx, preset: str):
+        """
+        Mejores tiempos del servidor en carreras asíncronas de un preset.
+
+        Cuentan todas las carreras creadas con el preset, con o sin opciones extra (ejemplo: !ranking open).
+        """
+        if not is_preset(preset):
+            raise commands.errors.CommandInvokeError("No existe ningún preset con ese nombre.")
+        async with guild_db(ctx.guild.id) as db:
+            ranking = await db.read(get_preset_ranking, preset)
+
+        if not ranking:
+            raise commands.errors.CommandInvokeError("No hay resultados para ese preset.")
+
+        msg = "**Ranking de {}**\n```\n".format(preset)
+        for pos, (name, best_time, races) in enumerate(ranking, 1):
+            msg += "{:2d}. {:17s} {} ({} carreras)\n".format(pos, name[:17], format_time(best_time), races)
+        msg += "```"
+        await ctx.reply(msg, mention_author=False)
 
 
     ########################################
@@ -424,62 +470,48 @@ class AsyncRace(commands.Cog):
         """
         message = ctx.message
         await message.delete()
+        ctx.message_deleted = True
        
-        db_conn, db_cur = open_db(ctx.guild.id)
-
-        race = get_async_by_submit(db_cur, ctx.channel.id)
+        async with guild_db(ctx.guild.id) as db:
+            race = await db.read(get_async_by_submit, ctx.channel.id)
+
+            if not race:
+                return
+
+            if race[5] == 0:
+                if ctx.invoked_with == "forfeit" or ctx.invoked_with == "ff" or time.lower() == "ff":
+                    time = "99:59:59"
+                    collection = 0
+                if re.match(r'\d?\d:[0-5]\d:[0-5]\d$', time) and collection >= 0:
+                    time_arr = [int(x) for x in time.split(':')]
+                    time_s = 3600*time_arr[0] + 60*time_arr[1] + time_arr[2]
+                
+                    author = ctx.author
+                    async with db.write_lock:
+                        await db.write_many((insert_player, author), (save_async_result, race[0], author.id, time_s, collection))
+                        player = await db.read(get_player_by_id, author.id)
+                        leaderboard = await self.get_leaderboard(db, race[0])
+                        leaderboard.submit(author.id, player[1], time_s, collection, datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"))
 
-        if not race:
-            close_db(db_conn)
-            return
+                    self.get_results_updater(ctx.guild, race, leaderboard).update()
 
-        if race[5] == 0:
-            if ctx.invoked_with == "forfeit" or ctx.invoked_with == "ff" or time.lower() == "ff":
-                time = "99:59:59"
-                collection = 0
-            if re.match(r'\d?\d:[0-5]\d:[0-5]\d$', time) and collection >= 0:
-                time_arr = [int(x) for x in time.split(':')]
-                time_s = 3600*time_arr[0] + 60*time_arr[1] + time_arr[2]
-                
-                author = ctx.author
-                async with write_lock:
-                    insert_player_if_not_exists(db_cur, author.id, author.name, author.discriminator, author.mention)
-                    save_async_result(db_cur, race[0], author.id, time_s, collection)
-                    commit_db(db_conn)
-
-                results_text = get_results_text(db_cur, race[11])
-                results_channel = ctx.guild.get_channel(race[12])
-                results_msg = await results_channel.fetch_message(race[13])
-                await results_msg.edit(content=results_text)
-
-                async_role = ctx.guild.get_role(race[10])
-                await author.add_roles(async_role)
-                await ctx.send("GG {}, tu resultado se ha registrado.".format(author.mention))
+                    async_role = ctx.guild.get_role(race[10])
+                    await author.add_roles(async_role)
+                    await ctx.send("GG {}, tu resultado se ha registrado.".format(author.mention))
         
-            else:
-                close_db(db_conn)
-                raise commands.errors.CommandInvokeError("Parámetros inválidos.")
-        
-        else:
-            close_db(db_conn)
-            raise commands.errors.CommandInvokeError("Esta carrera asíncrona no está abierta.")
+                else:
+                    raise commands.errors.CommandInvokeError("Parámetros inválidos.")
         
-        close_db(db_conn)
+            else:
+                raise commands.errors.CommandInvokeError("Esta carrera asíncrona no está abierta.")
 
 
     @done.error
     async def done_error(self, ctx, error):
-        error_mes = "Se ha producido un error."
-        if type(error) == commands.errors.MissingRequiredArgument:
-            message = ctx.message
-            await message.delete()
-            error_mes = "Faltan argumentos para ejecutar el comando."
-        elif type(error) == commands.errors.BadArgument:
-            message = ctx.message
-            await message.delete()
-            error_mes = "Argumentos inválidos."
-        elif type(error) == commands.errors.CommandInvokeError:
-            error_mes = error.original
-        
-        err_file = discord.File("res/almeida{}.png".format(randint(0, 3)))
-        await ctx.send(error_mes, file=err_file)
+        # Se borra el mensaje para no dejar a la vista un resultado mal escrito. La respuesta la envía BolasBot
+        if type(error) in (commands.errors.MissingRequiredArgument, commands.errors.BadArgument):
+            try:
+                await ctx.message.delete()
+            except discord.HTTPException:
+                pass
+            ctx.message_deleted = True
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+
+import discord
+
+from src.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+class ResultsUpdater:
+    """
+    Mantiene actualizado el mensaje de resultados de una carrera asíncrona.
+
+    Los cambios en la clasificación se acumulan y el mensaje se edita como máximo una vez cada interval segundos,
+    siempre con la clasificación más reciente. El mensaje no se vuelve a descargar de Discord en cada edición.
+    Al cerrarlo se envía la edición pendiente, si la hay. Los cambios y las ediciones se cuentan en la métrica
+    results_edits.
+    """
+    def __init__(self, channel, message_id, leaderboard, interval):
+        self.message = channel.get_partial_message(message_id)
+        self.leaderboard = leaderboard
+        self.interval = interval
+        self.dirty = False
+        self.task = None
+        self.requested = 0
+        self.edits = 0
+
+    @property
+    def saved(self):
+        return self.requested - self.edits
+
+    def update(self):
+        self.requested += 1
+        metrics.inc("results_edits", result="requested")
+        self.dirty = True
+        if not self.task or self.task.done():
+            self.task = asyncio.create_task(self.flush_loop())
+
+    async def flush_loop(self):
+        while self.dirty:
+            await self.flush()
+            await asyncio.sleep(self.interval)
+
+    async def flush(self):
+        self.dirty = False
+        try:
+            await self.message.edit(content=self.leaderboard.render())
+            self.edits += 1
+            metrics.inc("results_edits", result="sent")
+        except asyncio.CancelledError:
+            # La edición se ha interrumpido a medias: sigue pendiente para close()
+            self.dirty = True
+            raise
+        except discord.HTTPException as e:
+            metrics.inc("results_edits", result="failed")
+            logger.warning("No se pudo editar el mensaje de resultados %s: %s", self.message.id, e)
+        except Exception:
+            # Cualquier otro error tampoco debe detener las ediciones siguientes
+            metrics.inc("results_edits", result="failed")
+            logger.exception("Error al editar el mensaje de resultados %s", self.message.id)
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+        # El último cambio se envía sin esperar al intervalo, en lugar de perderse
+        if self.dirty:
+            await self.flush()
+        logger.info("Mensaje de resultados %s: %d cambios, %d ediciones, %d ediciones ahorradas",
+                    self.message.id, self.requested, self.edits, self.saved)
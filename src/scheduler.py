@@ -0,0 +1,101 @@
+from collections import OrderedDict, deque
+import asyncio
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class BackendScheduler:
+    """
+    Limita las peticiones simultáneas a un servicio externo de generación de seeds.
+
+    Como máximo se ejecutan concurrency peticiones a la vez. Las demás esperan en una cola FIFO por servidor, y las
+    colas de los distintos servidores se atienden por turnos, de modo que un servidor con muchas peticiones no deja
+    sin servicio al resto. Las peticiones con la misma clave que otra ya en curso no se repiten: esperan el resultado
+    de la primera.
+    """
+    def __init__(self, name, concurrency):
+        self.name = name
+        self.concurrency = concurrency
+        self.running = 0
+        self.queues = OrderedDict()     # servidor -> deque de futuros en espera, en orden de turno
+        self.in_flight = {}             # clave -> tarea en curso
+
+    def waiting(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+    def position(self, guild, waiter):
+        # Antes que esta petición se atienden "index" turnos completos, más las colas que van antes en el turno actual
+        index = self.queues[guild].index(waiter)
+        ahead = index
+        before = True
+        for other, other_queue in self.queues.items():
+            if other == guild:
+                before = False
+                continue
+            ahead += min(len(other_queue), index)
+            if before and len(other_queue) > index:
+                ahead += 1
+        return ahead + 1
+
+    async def acquire(self, guild, notify=None):
+        if self.running < self.concurrency and not self.queues:
+            self.running += 1
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.queues.setdefault(guild, deque()).append(waiter)
+        try:
+            if notify:
+                try:
+                    await notify(self.position(guild, waiter))
+                except Exception as e:
+                    # Un aviso que no se puede enviar no debe impedir la petición
+                    logger.warning("No se pudo avisar de la posición en la cola de %s: %s", self.name, e)
+            await waiter
+        except BaseException:
+            # Si el hueco ya se había pasado a esta petición, se pasa a la siguiente; si no, se sale de la cola
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                self.remove(guild, waiter)
+            raise
+
+    def remove(self, guild, waiter):
+        queue = self.queues.get(guild)
+        if queue and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del self.queues[guild]
+
+    def release(self):
+        while self.queues:
+            guild, queue = next(iter(self.queues.items()))
+            waiter = queue.popleft()
+            if queue:
+                self.queues.move_to_end(guild)
+            else:
+                del self.queues[guild]
+            if not waiter.done():
+                waiter.set_result(None)     # El hueco pasa directamente a la siguiente petición
+                return
+        self.running -= 1
+
+    async def run(self, guild, func, notify=None, key=None):
+        if key is not None and key in self.in_flight:
+            return await asyncio.shield(self.in_flight[key])
+
+        async def scheduled():
+            await self.acquire(guild, notify)
+            try:
+                return await func()
+            finally:
+                self.release()
+
+        task = asyncio.ensure_future(scheduled())
+        if key is not None:
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+            return await asyncio.shield(task)
+        return await task
@@ -1,34 +1,57 @@
 from pathlib import Path
 import re
-from random import randint, choice
-from io import StringIO
-from json import dumps
-
-import yaml
+from random import choice
+from io import BytesIO, StringIO
+import gzip
+import csv
+import asyncio
+import logging
 
 import pyz3r
+from pyz3r.alttpr import alttprClass
 
 import discord
 
 from discord.ext import commands
 
+from src.seedpool import SeedPool
+from src.presets import PresetRegistry
+from src.settings_cache import load_settings, copy_settings
+from src.scheduler import BackendScheduler
+from src.hashcache import HashCache
+from src.mystery import MysteryWeights, format_stats
+from src.metrics import metrics
+from src.spoiler import format_spoiler
+
+
+logger = logging.getLogger(__name__)
+
+SPOILER_GZIP_THRESHOLD = 1024 * 1024
+
+MAX_MYSTERY_ROLLS = 20000
+MAX_BATCH_SEEDS = 16
 
-DUNGEON_CODES = {
-    "H2": "H2-HyruleCastle",
-    "A1": "A1-CastleTower",
-    "P1": "P1-EasternPalace",
-    "P2": "P2-DesertPalace",
-    "P3": "P3-TowerOfHera",
-    "D1": "D1-PalaceOfDarkness",
-    "D2": "D2-SwampPalace",
-    "D3": "D3-SkullWoods",
-    "D4": "D4-ThievesTown",
-    "D5": "D5-IcePalace",
-    "D6": "D6-MiseryMire",
-    "D7": "D7-TurtleRock",
-    "A2": "A2-GanonsTower"
+# Un planificador por cada servicio externo de generación
+schedulers = {
+    "alttpr": BackendScheduler("alttpr", 2),
+    "samus": BackendScheduler("samus", 2),
+    "varia": BackendScheduler("varia", 1)
 }
 
+preset_registry = PresetRegistry()
+hash_cache = None
+with open('res/default-customizer.yaml', "r", encoding="utf-8") as custom_file:
+    default_customizer = load_settings(custom_file.read())
+seed_pool = None
+
+
+def get_seed_code(seed):
+    if not hasattr(seed, "randomizer"):     # VARIA randomizer
+        return ""
+    if seed.randomizer in ["sm", "smz3"]:
+        return " | ".join(seed.code.split())
+    return " | ".join(seed.code)
+
 
 def get_seed_data(seed, preset=""):
     if not hasattr(seed, "randomizer"):     # VARIA randomizer
@@ -36,29 +59,32 @@ def get_seed_data(seed, preset=""):
             return "**Preset: **{}\n**URL: **{}".format(preset, seed.url)
         return "**URL: **{}".format(seed.url)
 
-    if seed.randomizer in ["sm", "smz3"]:
-        code = " | ".join(seed.code.split())
-    else:
-        code = " | ".join(seed.code)
-
+    code = get_seed_code(seed)
     if preset:
         return "**Preset: **{}\n**URL: **{}\n**Hash: **{}".format(preset, seed.url, code)
     return "**URL: **{}\n**Hash: **{}".format(seed.url, code)
 
 
 def is_preset(preset):
-    if list(Path('rando-settings').glob('*/{}.yaml'.format(preset))):
-        return True
-    return False
+    return preset in preset_registry
+
+
+def configure_generation(settings):
+    for backend, concurrency in settings.items():
+        if backend not in schedulers:
+            raise ValueError("Servicio de generación desconocido: {}".format(backend))
+        schedulers[backend].concurrency = int(concurrency)
+
+
+def request_origin(ctx):
+    async def notify(position):
+        await ctx.send("Hay muchas seeds generándose ahora mismo. Tu petición está en la posición {} de la cola.".format(position))
+    return (ctx.guild.id if ctx.guild else ctx.channel.id), notify
 
 
 def add_default_customizer(settings_yaml):
     if "l" not in settings_yaml["settings"]:
-        custom_settings = ""
-        with open('res/default-customizer.yaml', "r", encoding="utf-8") as custom_file:
-            custom_settings = custom_file.read()
-        custom_yaml = yaml.load(custom_settings, Loader=yaml.FullLoader)
-        settings_yaml["settings"] = {**settings_yaml["settings"], **custom_yaml}
+        settings_yaml["settings"] = {**settings_yaml["settings"], **copy_settings(default_customizer)}
 
 
 async def generate_alttpr(settings_yaml, extra):
@@ -112,56 +138,114 @@ async def generate_varia(settings_yaml, extra):
     return await pyz3r.smvaria.SuperMetroidVaria.create(**settings_yaml["settings"], race=True)
 
 
-async def generate_from_yaml(yaml_contents, extra):
-    settings_yaml = yaml.load(yaml_contents, Loader=yaml.FullLoader)
-    if settings_yaml["randomizer"] == "alttp":
-        return await generate_alttpr(settings_yaml, extra)
-    elif settings_yaml["randomizer"] == "mystery":
-        return await generate_mystery(settings_yaml, extra)
-    elif settings_yaml["randomizer"] == "sm":
-        return await generate_sm(settings_yaml, extra)
-    elif settings_yaml["randomizer"] == "smz3":
-        return await generate_smz3(settings_yaml, extra)
-    elif settings_yaml["randomizer"] == "varia":
-        return await generate_varia(settings_yaml, extra)
-    return None
+# randomizer -> (función de generación, servicio externo)
+GENERATORS = {
+    "alttp": (generate_alttpr, "alttpr"),
+    "mystery": (generate_mystery, "alttpr"),
+    "sm": (generate_sm, "samus"),
+    "smz3": (generate_smz3, "samus"),
+    "varia": (generate_varia, "varia")
+}
 
 
-async def generate_from_attachment(attachment):
+async def generate_from_yaml(yaml_contents, extra=(), guild=None, notify=None):
+    settings_yaml = load_settings(yaml_contents)
+    return await generate_from_settings(settings_yaml, extra, guild, notify)
+
+
+async def generate_from_settings(settings_yaml, extra, guild=None, notify=None):
+    if settings_yaml["randomizer"] not in GENERATORS:
+        return None
+    generate, backend = GENERATORS[settings_yaml["randomizer"]]
+
+    async def timed_generate():
+        with metrics.timer("generate", backend=backend):
+            return await generate(settings_yaml, extra)
+
+    # "seed_request" incluye también la espera en la cola del planificador
+    with metrics.timer("seed_request", backend=backend):
+        seed = await schedulers[backend].run(guild, timed_generate, notify)
+    logger.debug("Seed generada con %s: %s", backend, getattr(seed, "url", None))
+    return seed
+
+
+async def generate_from_attachment(attachment, guild=None, notify=None):
     file_contents = await attachment.read()
-    return await generate_from_yaml(file_contents)
+    return await generate_from_yaml(file_contents, guild=guild, notify=notify)
 
 
-async def generate_from_preset(preset):
+async def generate_from_preset(preset, use_pool=True, guild=None, notify=None):
     preset_name = preset[0]
     extra = preset[1:]
     seed = None
 
-    if is_preset(preset_name):
-        my_settings = ""
-        p_file = next(Path("rando-settings").rglob("{}.yaml".format(preset_name)))
-        with open(p_file, "r", encoding="utf-8") as settings_file:
-            my_settings = settings_file.read()
-        seed = await generate_from_yaml(my_settings, extra)
+    if use_pool and not extra and seed_pool and preset_name in seed_pool:
+        seed = await seed_pool.get(preset_name)
+        metrics.inc("seedpool", result="hit" if seed else "miss")
+        if seed:
+            return seed
+
+    my_preset = preset_registry.get(preset_name)
+    if my_preset:
+        seed = await generate_from_settings(copy_settings(my_preset.settings), extra, guild, notify)
     
     return seed
 
 
-async def generate_from_hash(my_hash):
-    seed = await pyz3r.alttpr(hash_id=my_hash)
+async def generate_from_hash(my_hash, guild=None, notify=None):
+    if hash_cache:
+        data = await hash_cache.get(my_hash)
+        metrics.inc("hashcache", result="hit" if data else "miss")
+        if data:
+            return seed_from_data(data, my_hash)
+
+    async def timed_fetch():
+        with metrics.timer("generate", backend="alttpr_hash"):
+            return await pyz3r.alttpr(hash_id=my_hash)
+
+    seed = await schedulers["alttpr"].run(guild, timed_fetch, notify, key=my_hash)
+    if hash_cache and seed_to_data(seed):
+        await hash_cache.put(my_hash, seed_to_data(seed))
     return seed
 
 
+def seed_to_data(seed):
+    if getattr(seed, "randomizer", None) == "alttpr":
+        return seed.data
+    return None
+
+
+def seed_from_data(data, seed_hash=None):
+    seed = alttprClass(hash_id=seed_hash or data["hash"])
+    seed.randomizer = "alttpr"
+    seed.data = data
+    return seed
+
+
+def enable_seed_pool(presets, depth):
+    global seed_pool
+    seed_pool = SeedPool(presets, depth, lambda preset: generate_from_preset([preset], use_pool=False), seed_to_data, seed_from_data)
+    return seed_pool
+
+
+def enable_hash_cache(ttl_days, max_entries):
+    global hash_cache
+    hash_cache = HashCache(ttl_days=ttl_days, max_entries=max_entries)
+    return hash_cache
+
+
 def get_spoiler(seed):
     spoiler_file = None
     if hasattr(seed, "get_formatted_spoiler"):
-        spoiler_text = seed.get_formatted_spoiler()
-        if spoiler_text:
-            spoiler_dumps = dumps(spoiler_text, indent=4)
-            for k, v in DUNGEON_CODES.items():
-                spoiler_dumps = spoiler_dumps.replace(k, v)
-            spoiler_io = StringIO(spoiler_dumps)
-            spoiler_file = discord.File(spoiler_io, filename="spoiler.json", spoiler=True)
+        spoiler = seed.get_formatted_spoiler()
+        if spoiler:
+            spoiler_bytes = format_spoiler(spoiler)
+            filename = "spoiler.json"
+            if len(spoiler_bytes) > SPOILER_GZIP_THRESHOLD:
+                spoiler_bytes = gzip.compress(spoiler_bytes)
+                filename = "spoiler.json.gz"
+            spoiler_io = BytesIO(spoiler_bytes)
+            spoiler_file = discord.File(spoiler_io, filename=filename, spoiler=True)
     return spoiler_file
 
 
@@ -197,19 +281,21 @@ class Seedgen(commands.Cog):
         """
         seed = None
         preset_used = False
+        guild, notify = request_origin(ctx)
 
         async with ctx.typing():
             if ctx.message.attachments:
                 try:
-                    seed = await generate_from_attachment(ctx.message.attachments[0])
+                    seed = await generate_from_attachment(ctx.message.attachments[0], guild, notify)
                 except:
+                    logger.warning("Error al generar una seed desde un YAML", exc_info=True)
                     raise commands.errors.CommandInvokeError("Error al generar la seed. Asegúrate de que el YAML introducido sea válido.")
             elif preset:
                 if re.match(r'https://alttpr\.com/([a-z]{2}/)?h/\w{10}$', preset[0]):
                     seed_hash = (preset[0]).split('/')[-1]
-                    seed = await generate_from_hash(seed_hash)
+                    seed = await generate_from_hash(seed_hash, guild, notify)
                 else:
-                    seed = await generate_from_preset(preset)
+                    seed = await generate_from_preset(preset, guild=guild, notify=notify)
                     preset_used = True
             
         if seed:
@@ -220,18 +306,8 @@ class Seedgen(commands.Cog):
                 await ctx.reply(get_seed_data(seed), mention_author=False, file=spoiler_file)
         else:
             raise commands.errors.CommandInvokeError("Error al generar la seed. Asegúrate de que el preset o YAML introducido sea válido.")
-    
-    
-    @seed.error
-    async def seed_error(self, ctx, error):
-        error_mes = "Se ha producido un error."
-        if type(error) == commands.errors.CommandInvokeError:
-            error_mes = error.original
-        
-        err_file = discord.File("res/almeida{}.png".format(randint(0, 3)))
-        await ctx.send(error_mes, file=err_file)
 
-    
+
     @commands.command(aliases=["presets"])
     async def preset(self, ctx, preset: str=""):
         """
@@ -240,36 +316,21 @@ class Seedgen(commands.Cog):
         Usado sin parámetros, lista los presets disponibles. Añadiendo el nombre de un preset, da más detalles sobre el mismo.
         """
         msg = ""
-        if not preset or not is_preset(preset):
+        my_preset = preset_registry.get(preset)
+        if not my_preset:
             msg += "**Presets disponibles: **\n```"
-            for folder in sorted(Path("rando-settings").iterdir()):
-                msg += "{}:\n".format(folder.stem)
-                preset_files = sorted(folder.glob("*.yaml"))
-                for f in preset_files:
-                    msg += " - {}\n".format(f.stem)
+            for category, preset_names in preset_registry.categories().items():
+                msg += "{}:\n".format(category)
+                for name in preset_names:
+                    msg += " - {}\n".format(name)
                 msg += "\n"
             msg += "```"
         
         else:
-            my_settings = ""
-            p_file = next(Path("rando-settings").rglob("{}.yaml".format(preset)))
-            with open(p_file, "r", encoding="utf-8") as settings_file:
-                my_settings = settings_file.read()
-                settings_yaml = yaml.load(my_settings, Loader=yaml.FullLoader)
-                msg += "**{}**: {}".format(settings_yaml["goal_name"], settings_yaml["description"])
+            msg += "**{}**: {}".format(my_preset.settings.get("goal_name", my_preset.name), my_preset.description)
         
         await ctx.reply(msg, mention_author=False)
 
-    
-    @preset.error
-    async def preset_error(self, ctx, error):
-        error_mes = "Se ha producido un error."
-        if type(error) == commands.errors.CommandInvokeError:
-            error_mes = error.original
-        
-        err_file = discord.File("res/almeida{}.png".format(randint(0, 3)))
-        await ctx.send(error_mes, file=err_file)
-    
 
     @commands.command(aliases=["random"])
     async def randomseed(self, ctx, *presets):
@@ -281,33 +342,105 @@ class Seedgen(commands.Cog):
         Si se da una lista de presets como parámetro, se seleccionará uno de ellos. Para usar un preset con modificadores, rodearlo entre comillas (ejemplo: "open spoiler").
         """
         if not presets:
-            preset_list = []
-            for preset_file in Path("rando-settings/alttp").iterdir():
-                preset_list.append(preset_file.stem)
+            preset_list = preset_registry.categories()["alttp"]
             await Seedgen.seed(self, ctx, choice(preset_list))
         else:
             preset_list = list(presets)
-            while True:
+            while preset_list:
                 preset_choice = choice(preset_list)
                 if is_preset(preset_choice.split()[0]):
                     await Seedgen.seed(self, ctx, *preset_choice.split())
-                    break
+                    return
                 else:
                     preset_list.remove(preset_choice)
+            raise commands.errors.CommandInvokeError("Ninguno de los presets dados es válido.")
+
+
+    @commands.command(aliases=["reserva"])
+    @commands.is_owner()
+    async def seedpool(self, ctx):
+        """
+        Estado de la reserva de seeds pregeneradas.
+
+        Muestra, para cada preset, las seeds disponibles, la tasa de aciertos y el tiempo medio de reposición.
+        """
+        if not seed_pool:
+            raise commands.errors.CommandInvokeError("La reserva de seeds está desactivada.")
+        await ctx.reply("```\n{}\n```".format(seed_pool.summary()), mention_author=False)
+
+
+    @commands.command(aliases=["lote"])
+    async def seeds(self, ctx, cantidad: int, *preset):
+        """
+        Crea varias seeds a la vez con el mismo preset.
+
+        Indica el número de seeds (máximo 16) y el preset, con sus opciones extra si las necesitas. Las seeds se generan
+        a la vez y aparecen en el mensaje a medida que terminan. Al final se adjunta un CSV con las URL y los hashes.
+        """
+        if not preset or not is_preset(preset[0]):
+            raise commands.errors.CommandInvokeError("Indica un preset válido.")
+        cantidad = min(max(cantidad, 1), MAX_BATCH_SEEDS)
+        guild, _ = request_origin(ctx)
+
+        async def generate(index):
+            try:
+                return index, await generate_from_preset(preset, guild=guild)
+            except Exception:
+                logger.warning("Error al generar la seed %d del lote de %s", index + 1, " ".join(preset), exc_info=True)
+                return index, None
+
+        results = [None] * cantidad
+        done = [False] * cantidad
+
+        def render():
+            lines = ["**Preset: **{} ({}/{})".format(" ".join(preset), sum(done), cantidad)]
+            for i, seed in enumerate(results):
+                status = seed.url if seed else ("Error al generar la seed." if done[i] else "Generando...")
+                lines.append("{}. {}".format(i + 1, status))
+            return "\n".join(lines)
+
+        msg = await ctx.reply(render(), mention_author=False)
+        for next_done in asyncio.as_completed([generate(i) for i in range(cantidad)]):
+            index, seed = await next_done
+            results[index] = seed
+            done[index] = True
+            await msg.edit(content=render())
+
+        seeds_csv = StringIO()
+        writer = csv.writer(seeds_csv)
+        writer.writerow(["n", "url", "hash"])
+        for i, seed in enumerate(results):
+            if seed:
+                writer.writerow([i + 1, seed.url, get_seed_code(seed)])
+        seeds_file = discord.File(BytesIO(seeds_csv.getvalue().encode("utf-8")), filename="seeds.csv")
+        await ctx.reply(file=seeds_file, mention_author=False)
+
+
+    @commands.command()
+    async def mysterystats(self, ctx, preset: str="mystery", tiradas: int=1000, semilla: int=None):
+        """
+        Distribución de los ajustes de un preset mystery.
+
+        Genera el número de tiradas indicado (por defecto 1000, como máximo 20000) con los pesos del preset, sin crear
+        ninguna seed, y muestra el porcentaje con el que ha salido cada valor. Indicando una semilla se obtienen siempre
+        las mismas tiradas.
+        """
+        my_preset = preset_registry.get(preset)
+        if not my_preset or my_preset.settings.get("randomizer") != "mystery":
+            raise commands.errors.CommandInvokeError("No hay un preset mystery con el nombre dado.")
+        tiradas = min(max(tiradas, 1), MAX_MYSTERY_ROLLS)
+
+        # Las tiradas se hacen fuera del bucle de eventos: con muchas tiradas pueden tardar más de 100 ms
+        weights = MysteryWeights(my_preset.settings)
+        stats, elapsed = await asyncio.get_running_loop().run_in_executor(None, weights.stats, tiradas, semilla)
+        msg = "**{}**: {} tiradas en {:.1f} ms\n".format(preset, tiradas, elapsed * 1000)
+        stats_text = format_stats(stats, tiradas)
+        if len(msg) + len(stats_text) + 8 <= 2000:
+            await ctx.reply("{}```\n{}\n```".format(msg, stats_text), mention_author=False)
+        else:
+            stats_file = discord.File(BytesIO(stats_text.encode("utf-8")), filename="{}.txt".format(preset))
+            await ctx.reply(msg, mention_author=False, file=stats_file)
 
-    
-    @randomseed.error
-    async def randomseed_error(self, ctx, error):
-        error_mes = "Se ha producido un error."
-        if type(error) == commands.errors.CommandInvokeError:
-            if type(error.original) == IndexError:
-                error_mes = "Ninguno de los presets dados es válido."
-            else:
-                error_mes = error.original
-        
-        err_file = discord.File("res/almeida{}.png".format(randint(0, 3)))
-        await ctx.send(error_mes, file=err_file)
-    
 
     @commands.command()
     async def yaml(self, ctx, archivo: str="ajustes"):
@@ -323,14 +456,4 @@ class Seedgen(commands.Cog):
             my_yaml = discord.File("res/yaml/{}.yaml".format(archivo))
             await ctx.reply(file=my_yaml)
         else:
-            raise commands.errors.CommandInvokeError("No hay un YAML de ejemplo con el nombre dado.")
-
-
-    @yaml.error
-    async def yaml_error(self, ctx, error):
-        error_mes = "Se ha producido un error."
-        if type(error) == commands.errors.CommandInvokeError:
-            error_mes = error.original
-        
-        err_file = discord.File("res/almeida{}.png".format(randint(0, 3)))
-        await ctx.send(error_mes, file=err_file)
\ No newline at end of file
+            raise commands.errors.CommandInvokeError("No hay un YAML de ejemplo con el nombre dado.")
\ No newline at end of file
@@ -0,0 +1,121 @@
+from pathlib import Path
+from collections import deque
+from time import perf_counter
+import asyncio
+import json
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+POOL_DIR = "data/seedpool"
+RETRY_DELAY = 60
+
+
+class SeedPool:
+    """
+    Reserva de seeds pregeneradas para presets populares.
+
+    Para cada preset se mantienen hasta depth seeds ya generadas, guardadas en disco en POOL_DIR/<preset>/<hash>.json
+    para que sobrevivan a reinicios del bot. Cada seed servida se elimina de la reserva y una tarea en segundo plano
+    genera otra para reponerla.
+
+    generate(preset) es la corrutina que genera una seed nueva; to_data(seed) y from_data(data) convierten una seed
+    a datos serializables en JSON y viceversa.
+    """
+    def __init__(self, presets, depth, generate, to_data, from_data, pool_dir=POOL_DIR):
+        self.depth = depth
+        self.generate = generate
+        self.to_data = to_data
+        self.from_data = from_data
+        self.pool_dir = Path(pool_dir)
+        self.queues = {}
+        self.stats = {}
+        for preset in presets:
+            preset_dir = self.pool_dir / preset
+            preset_dir.mkdir(parents=True, exist_ok=True)
+            stored = sorted(preset_dir.glob("*.json"), key=lambda f: f.stat().st_mtime)
+            self.queues[preset] = deque(f.stem for f in stored)
+            self.stats[preset] = {"hits": 0, "misses": 0, "refills": 0, "refill_time": 0.0}
+        self.refill_needed = asyncio.Event()
+        self.refill_task = None
+
+    def __contains__(self, preset):
+        return preset in self.queues
+
+    def start(self):
+        if not self.refill_task or self.refill_task.done():
+            self.refill_task = asyncio.create_task(self.refill_loop())
+        self.refill_needed.set()
+
+    def stop(self):
+        if self.refill_task:
+            self.refill_task.cancel()
+
+    def seed_path(self, preset, seed_hash):
+        return self.pool_dir / preset / "{}.json".format(seed_hash)
+
+    def read_seed(self, path):
+        with open(path, "r", encoding="utf-8") as seed_file:
+            data = json.load(seed_file)
+        path.unlink()
+        return data
+
+    def write_seed(self, path, data):
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as seed_file:
+            json.dump(data, seed_file)
+        tmp_path.replace(path)
+
+    async def get(self, preset):
+        queue = self.queues.get(preset)
+        if queue is None:
+            return None
+
+        loop = asyncio.get_running_loop()
+        while queue:
+            seed_hash = queue.popleft()
+            self.refill_needed.set()
+            try:
+                data = await loop.run_in_executor(None, self.read_seed, self.seed_path(preset, seed_hash))
+            except (OSError, ValueError) as e:
+                logger.warning("Seed %s de la reserva de %s inválida: %s", seed_hash, preset, e)
+                continue
+            self.stats[preset]["hits"] += 1
+            return self.from_data(data)
+
+        self.stats[preset]["misses"] += 1
+        return None
+
+    async def refill_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.refill_needed.wait()
+            self.refill_needed.clear()
+            for preset, queue in self.queues.items():
+                while len(queue) < self.depth:
+                    start = perf_counter()
+                    try:
+                        data = self.to_data(await self.generate(preset))
+                    except Exception as e:
+                        logger.warning("Error al reponer la reserva de %s: %s", preset, e)
+                        await asyncio.sleep(RETRY_DELAY)
+                        continue
+                    if not data:
+                        logger.warning("El preset %s no admite seeds pregeneradas", preset)
+                        break
+                    await loop.run_in_executor(None, self.write_seed, self.seed_path(preset, data["hash"]), data)
+                    queue.append(data["hash"])
+                    self.stats[preset]["refills"] += 1
+                    self.stats[preset]["refill_time"] += perf_counter() - start
+
+    def summary(self):
+        lines = []
+        for preset, queue in self.queues.items():
+            stats = self.stats[preset]
+            requests = stats["hits"] + stats["misses"]
+            hit_rate = 100 * stats["hits"] / requests if requests else 0
+            refill_avg = stats["refill_time"] / stats["refills"] if stats["refills"] else 0
+            lines.append("{:12s} {}/{}  aciertos {:3.0f}% ({}/{})  reposición media {:.1f} s".format(
+                preset, len(queue), self.depth, hit_rate, stats["hits"], requests, refill_avg))
+        return "\n".join(lines)
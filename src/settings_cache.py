@@ -0,0 +1,52 @@
+from collections import OrderedDict
+from hashlib import sha256
+from threading import Lock
+import pickle
+
+import yaml
+
+from src.metrics import metrics
+
+try:
+    from yaml import CSafeLoader as SettingsLoader
+except ImportError:
+    from yaml import SafeLoader as SettingsLoader
+
+
+MAX_CACHED_SETTINGS = 64
+
+# sha256 del YAML -> ajustes ya procesados, serializados con pickle
+settings_cache = OrderedDict()
+settings_cache_lock = Lock()
+
+
+def copy_settings(settings):
+    return pickle.loads(pickle.dumps(settings, pickle.HIGHEST_PROTOCOL))
+
+
+def load_settings(contents):
+    """
+    Procesa un YAML de ajustes, reutilizando el resultado si ya se ha procesado un YAML idéntico.
+
+    Siempre devuelve una copia nueva, que puede modificarse sin afectar a la caché.
+    """
+    if isinstance(contents, str):
+        contents = contents.encode("utf-8")
+    key = sha256(contents).digest()
+
+    with settings_cache_lock:
+        cached = settings_cache.get(key)
+        if cached:
+            settings_cache.move_to_end(key)
+    if cached:
+        metrics.inc("settings_cache", result="hit")
+        return pickle.loads(cached)
+
+    metrics.inc("settings_cache", result="miss")
+    with metrics.timer("yaml_parse"):
+        settings = yaml.load(contents, Loader=SettingsLoader)
+    with settings_cache_lock:
+        settings_cache[key] = pickle.dumps(settings, pickle.HIGHEST_PROTOCOL)
+        if len(settings_cache) > MAX_CACHED_SETTINGS:
+            settings_cache.popitem(last=False)
+    return settings
@@ -0,0 +1,30 @@
+import json
+import re
+
+
+DUNGEON_CODES = {
+    "H2": "H2-HyruleCastle",
+    "A1": "A1-CastleTower",
+    "P1": "P1-EasternPalace",
+    "P2": "P2-DesertPalace",
+    "P3": "P3-TowerOfHera",
+    "D1": "D1-PalaceOfDarkness",
+    "D2": "D2-SwampPalace",
+    "D3": "D3-SkullWoods",
+    "D4": "D4-ThievesTown",
+    "D5": "D5-IcePalace",
+    "D6": "D6-MiseryMire",
+    "D7": "D7-TurtleRock",
+    "A2": "A2-GanonsTower"
+}
+DUNGEON_CODES_RE = re.compile("|".join(DUNGEON_CODES))
+
+
+def format_spoiler(spoiler):
+    """
+    Vuelca el spoiler a JSON, con el nombre de cada mazmorra junto a su código, y lo devuelve codificado en UTF-8.
+
+    Los códigos se sustituyen en una sola pasada de la expresión regular sobre el texto ya volcado.
+    """
+    spoiler_dumps = json.dumps(spoiler, indent=4)
+    return DUNGEON_CODES_RE.sub(lambda m: DUNGEON_CODES[m.group(0)], spoiler_dumps).encode("utf-8")
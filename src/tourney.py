@@ -1,14 +1,20 @@
+import logging
 import re
-from random import choice, randint
+from random import choice
 
 from src.seedgen import Seedgen
-from src.db_utils import (write_lock, open_db, commit_db, close_db, insert_player_if_not_exists,
+from src.db_utils import (guild_db, insert_player,
     insert_private_race, get_active_private_races) 
 
 import discord
 from discord.ext import commands
 
 
+logger = logging.getLogger(__name__)
+
+TOURNEY_PRESETS = ["ambrosia", "casualboots", "mc", "open", "standard", "ad", "keysanity"]
+
+
 class Tourney(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
@@ -25,28 +31,19 @@ class Tourney(commands.Cog):
 
         Si se especifica la palabra clave "ro16", se eliminarán los modos que no pueden ser escogidos en octavos de final (ad, keysanity)-
         """
-        preset_list = ["ambrosia", "casualboots", "mc", "open", "standard", "ad", "keysanity"]
+        preset_list = list(TOURNEY_PRESETS)
         if "ro16" in bans:
             preset_list.remove("ad")
             preset_list.remove("keysanity")
         for b in bans:
             if b in preset_list:
                 preset_list.remove(b)
-        await Seedgen.seed(self, ctx, choice(preset_list))
+        if not preset_list:
+            raise commands.errors.CommandInvokeError("No queda ningún preset para elegir.")
+        preset = choice(preset_list)
+        logger.debug("Preset de torneo elegido entre %s: %s", preset_list, preset)
+        await Seedgen.seed(self, ctx, preset)
 
-    
-    @torneoseed.error
-    async def torneoseed_error(self, ctx, error):
-        error_mes = "Se ha producido un error."
-        if type(error) == commands.errors.CommandInvokeError:
-            if type(error.original) == IndexError:
-                error_mes = "No queda ningún preset para elegir."
-            else:
-                error_mes = error.original
-        
-        err_file = discord.File("res/almeida{}.png".format(randint(0, 3)))
-        await ctx.send(error_mes, file=err_file)
-    
 
     @commands.command()
     @commands.guild_only()
@@ -61,84 +58,64 @@ class Tourney(commands.Cog):
 
         Este comando solo puede ser ejecutado por un moderador.
         """
-        db_conn, db_cur = open_db(ctx.guild.id)
-        
-        creator = ctx.author
-
-        if not params:
-            close_db(db_conn)
-            raise commands.errors.CommandInvokeError("Faltan argumentos para ejecutar el comando.")
-
-        # Comprobación de límite: máximo de 10 carreras privadas en el servidor
-        races = get_active_private_races(db_cur)
-        if races and len(races) >= 10:
-            close_db(db_conn)
-            raise commands.errors.CommandInvokeError("Demasiadas carreras activas en el servidor. Contacta a un moderador para purgar alguna.")
-
-        # Comprobación de nombre
-        name = params[0]
-        players = params[1:]
-        if re.match(r'<@[!&]?\d+>', name):
-            name = "carrera-privada"
-            players = params
-        
-        if len(name) > 20:
-            name = name[:20]
+        async with guild_db(ctx.guild.id) as db:
+            creator = ctx.author
+
+            if not params:
+                raise commands.errors.CommandInvokeError("Faltan argumentos para ejecutar el comando.")
+
+            # Comprobación de límite: máximo de 10 carreras privadas en el servidor
+            races = await db.read(get_active_private_races)
+            if races and len(races) >= 10:
+                raise commands.errors.CommandInvokeError("Demasiadas carreras activas en el servidor. Contacta a un moderador para purgar alguna.")
+
+            # Comprobación de nombre
+            name = params[0]
+            players = params[1:]
+            if re.match(r'<@[!&]?\d+>', name):
+                name = "carrera-privada"
+                players = params
         
-        # Obtener participantes de la carrera
-        participants = [ctx.author]
-        roles = []
-        for p in players:
-            mention = re.match(r'<@!?(\d+)>', p)
-            if mention:
-                discord_id = int(mention.group(1))
-                member = ctx.guild.get_member(discord_id)
-                if member:
-                    participants.append(member)
-                continue
-            mention = re.match(r'<@&(\d+)>', p)
-            if mention:
-                role_id = int(mention.group(1))
-                role = ctx.guild.get_role(role_id)
-                if role:
-                    roles.append(role)
-
-        # Crear canal para la carrera
-        channel_overwrites = {
-            ctx.guild.default_role: discord.PermissionOverwrite(read_messages=False),
-            ctx.guild.me: discord.PermissionOverwrite(read_messages=True)
-        }
-        for m in participants:
-            channel_overwrites[m] = discord.PermissionOverwrite(read_messages=True)
-        for r in roles:
-            channel_overwrites[r] = discord.PermissionOverwrite(read_messages=True)
-
-        race_channel = await ctx.guild.create_text_channel(name, overwrites=channel_overwrites)
-
-        async with write_lock:    
-            for p in participants:
-                insert_player_if_not_exists(db_cur, p.id, p.name, p.discriminator, p.mention)
-            insert_private_race(db_cur, name, creator.id, race_channel.id)
-            commit_db(db_conn)
-
-        close_db(db_conn)
-
-        text_ans = 'Abierta carrera privada con nombre: {}\nCanal: {}'.format(name, race_channel.mention)
-
-        await ctx.reply(text_ans, mention_author=False)
-
-
-    @match.error
-    async def match_error(self, ctx, error):
-        error_mes = "Se ha producido un error."
-        if type(error) == commands.errors.MissingRequiredArgument:
-            error_mes = "Faltan argumentos para ejecutar el comando."
-        elif type(error) == commands.errors.MissingPermissions:
-            error_mes = "No tienes permiso para ejecutar este comando."
-        elif type(error) == commands.errors.BadArgument:
-            error_mes = "Argumentos inválidos."
-        elif type(error) == commands.errors.CommandInvokeError:
-            error_mes = error.original
+            if len(name) > 20:
+                name = name[:20]
         
-        err_file = discord.File("res/almeida{}.png".format(randint(0, 3)))
-        await ctx.reply(error_mes, mention_author=False, file=err_file)  
+            # Obtener participantes de la carrera
+            participants = [ctx.author]
+            roles = []
+            for p in players:
+                mention = re.match(r'<@!?(\d+)>', p)
+                if mention:
+                    discord_id = int(mention.group(1))
+                    member = ctx.guild.get_member(discord_id)
+                    if member:
+                        participants.append(member)
+                    continue
+                mention = re.match(r'<@&(\d+)>', p)
+                if mention:
+                    role_id = int(mention.group(1))
+                    role = ctx.guild.get_role(role_id)
+                    if role:
+                        roles.append(role)
+
+            # Crear canal para la carrera
+            channel_overwrites = {
+                ctx.guild.default_role: discord.PermissionOverwrite(read_messages=False),
+                ctx.guild.me: discord.PermissionOverwrite(read_messages=True)
+            }
+            for m in participants:
+                channel_overwrites[m] = discord.PermissionOverwrite(read_messages=True)
+            for r in roles:
+                channel_overwrites[r] = discord.PermissionOverwrite(read_messages=True)
+
+            race_channel = await ctx.guild.create_text_channel(name, overwrites=channel_overwrites)
+
+            async with db.write_lock:    
+                await db.write_many(*[(insert_player, p) for p in participants],
+                                    (insert_private_race, name, creator.id, race_channel.id))
+            logger.info("Carrera privada %s abierta en %s por %s, con %d jugadores", name, ctx.guild, creator,
+                        len(participants))
+
+
+            text_ans = 'Abierta carrera privada con nombre: {}\nCanal: {}'.format(name, race_channel.mention)
+
+            await ctx.reply(text_ans, mention_author=False)
@@ -1,28 +1,62 @@
-import asyncio
-from random import randint
+from io import BytesIO
+import logging
 
 import discord
 
 from discord.ext import commands
 
+from src.metrics import metrics
+from src.countdown import run_countdown, INTERVAL, MAX_COUNT
+
+
+logger = logging.getLogger(__name__)
+
+
 class Util(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
     
     @commands.command()
-    async def countdown(self, ctx, count: int=10):
+    async def countdown(self, ctx, count: int=10, modo: str=""):
         """
         Inicia una cuenta atrás.
 
         Se puede especificar el valor de inicio. Por defecto, es 10. Este valor es también el máximo.
+
+        Añadiendo "editar" después del valor de inicio, la cuenta atrás se muestra en un único mensaje que se va editando.
         """
-        count = min(abs(count), 10)
-        for i in range(count, 0, -1):
-            await ctx.send(str(i))
-            await asyncio.sleep(0.8)
-        await ctx.send("GO!")
-    
-    @countdown.error
-    async def countdown_error(self, ctx, error):
-        err_file = discord.File("res/almeida{}.png".format(randint(0, 3)))
-        await ctx.reply("Se ha producido un error.", mention_author=False, file=err_file)
+        count = min(abs(count), MAX_COUNT)
+        edit = None
+        if modo == "editar":
+            async def edit(message, text):
+                await message.edit(content=text)
+        lateness = await run_countdown(ctx.send, count, edit=edit)
+        if max(lateness) > INTERVAL / 2:
+            logger.warning("Cuenta atrás en %s con un retraso de hasta %.2f s", ctx.channel, max(lateness))
+
+    @commands.command()
+    @commands.is_owner()
+    async def botstats(self, ctx):
+        """
+        Latencias y contadores del bot desde que se inició.
+
+        Muestra el número de llamadas y los tiempos de respuesta de comandos, API de Discord, base de datos y generación
+        de seeds.
+        """
+        summary = metrics.summary()
+        if len(summary) + 8 <= 2000:
+            await ctx.reply("```\n{}\n```".format(summary), mention_author=False)
+        else:
+            await ctx.reply(file=discord.File(BytesIO(summary.encode("utf-8")), filename="stats.txt"), mention_author=False)
+
+    @commands.command(aliases=["lentos"])
+    @commands.is_owner()
+    async def slowcommands(self, ctx):
+        """
+        Funciones que más tiempo han ocupado en las últimas ejecuciones lentas de comandos.
+
+        Requiere activar el perfilado en la sección [profiling] de config.ini.
+        """
+        if not self.bot.profiler:
+            raise commands.errors.CommandInvokeError("El perfilado de comandos está desactivado.")
+        await ctx.reply("```\n{}\n```".format(self.bot.profiler.summary()[:1990]), mention_author=False)
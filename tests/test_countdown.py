@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from src.countdown import run_countdown, INTERVAL
+
+
+class FakeClock:
+    """
+    Reloj simulado: sleep() avanza el reloj en vez de esperar, y cada envío tarda lo que indique latencies.
+    """
+    def __init__(self, latencies=()):
+        self.now = 0.0
+        self.latencies = list(latencies)
+        self.sent = []
+        self.edited = []
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, delay):
+        self.now += delay
+
+    def latency(self):
+        return self.latencies.pop(0) if self.latencies else 0.0
+
+    async def send(self, text):
+        self.now += self.latency()
+        self.sent.append((self.now, text))
+        return text
+
+    async def edit(self, message, text):
+        self.now += self.latency()
+        self.edited.append((self.now, text))
+
+
+def countdown(clock, count, edit=False):
+    return asyncio.run(run_countdown(clock.send, count, edit=clock.edit if edit else None, clock=clock,
+                                     sleep=clock.sleep))
+
+
+def test_instant_sends_arrive_on_time():
+    clock = FakeClock()
+    lateness = countdown(clock, 3)
+    assert [text for _, text in clock.sent] == ["3", "2", "1", "GO!"]
+    assert lateness == [0, 0, 0, 0]
+    assert clock.now == pytest.approx(3 * INTERVAL)
+
+
+def test_constant_latency_is_compensated():
+    clock = FakeClock([0.3] * 11)
+    lateness = countdown(clock, 10)
+    # El primer envío llega tarde; a partir de ahí se adelanta lo que tarda en llegar
+    assert lateness[0] == pytest.approx(0.3)
+    assert lateness[1:] == pytest.approx([0] * 10)
+
+
+def test_slow_send_does_not_shift_later_ticks():
+    clock = FakeClock([0.1, 0.1, 1.0] + [0.1] * 8)
+    lateness = countdown(clock, 10)
+    assert lateness[2] == pytest.approx(0.9)
+    # Cada número tiene su instante fijo: el retraso de un envío no se arrastra a los siguientes
+    assert all(abs(late) <= 0.25 for late in lateness[3:])
+    assert abs(lateness[-1]) < 0.01
+    assert clock.sent[-1][0] == pytest.approx(10 * INTERVAL, abs=0.01)
+
+
+def test_latency_longer_than_interval():
+    clock = FakeClock([2 * INTERVAL] * 4)
+    lateness = countdown(clock, 3)
+    # Si cada envío tarda más que el intervalo, los números salen seguidos, sin esperas entre ellos
+    assert lateness == pytest.approx([2 * INTERVAL, 3 * INTERVAL, 4 * INTERVAL, 5 * INTERVAL])
+    assert clock.now == pytest.approx(8 * INTERVAL)
+
+
+def test_edit_mode_sends_once_and_edits_the_rest():
+    clock = FakeClock([0.2] * 6)
+    lateness = countdown(clock, 5, edit=True)
+    assert [text for _, text in clock.sent] == ["5"]
+    assert [text for _, text in clock.edited] == ["4", "3", "2", "1", "GO!"]
+    assert lateness[0] == pytest.approx(0.2)
+    assert lateness[1:] == pytest.approx([0] * 5)
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import socket
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web
+
+from src.http_client import HTTPClient, HTTPError
+
+
+class FakeArchipelago:
+    """
+    Servidor local que hace de endpoint de generación: responde lo que diga reply a cada POST y guarda las peticiones.
+    """
+    def __init__(self, reply):
+        self.reply = reply
+        self.requests = []
+
+    async def handle(self, request):
+        self.requests.append(await request.post())
+        return await self.reply()
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_post("/api/generate", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.endpoint = "http://127.0.0.1:{}/api/generate".format(port)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.runner.cleanup()
+
+
+def free_port():
+    # Un puerto en el que no escucha nadie, para que la conexión falle antes de enviar nada
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def post(reply, client, **kwargs):
+    async def run():
+        async with FakeArchipelago(reply) as server:
+            try:
+                return await client.post_form(server.endpoint, **kwargs), server.requests
+            finally:
+                await client.close()
+    return asyncio.run(run())
+
+
+def test_form_and_file_are_sent():
+    async def created():
+        return web.json_response({"url": "https://archipelago.gg/room/abc"}, status=201)
+
+    (status, response), requests = post(created, HTTPClient(), fields={"race": 1},
+                                        files={"file": ("multi.zip", b"PK\x03\x04zip")})
+    assert status == 201
+    assert response == {"url": "https://archipelago.gg/room/abc"}
+    assert requests[0]["race"] == "1"
+    assert requests[0]["file"].filename == "multi.zip"
+    assert requests[0]["file"].file.read() == b"PK\x03\x04zip"
+
+
+def test_server_error_is_not_retried():
+    async def unavailable():
+        return web.Response(status=503, text="")
+
+    (status, response), requests = post(unavailable, HTTPClient(backoff=0), fields={"race": 1})
+    assert (status, response) == (503, None)
+    assert len(requests) == 1
+
+
+def test_timeout_is_not_retried():
+    async def slow():
+        await asyncio.sleep(1)
+        return web.json_response({}, status=201)
+
+    requests = []
+
+    async def run():
+        async with FakeArchipelago(slow) as server:
+            client = HTTPClient(timeout=0.2, backoff=0)
+            try:
+                with pytest.raises(HTTPError, match="tiempo de espera agotado"):
+                    await client.post_form(server.endpoint, fields={"race": 1})
+            finally:
+                await client.close()
+            # Se espera a que termine la petición lenta, por si se hubiera reenviado
+            await asyncio.sleep(1)
+            requests.extend(server.requests)
+
+    asyncio.run(run())
+    assert len(requests) == 1
+
+
+def test_connect_error_is_retried(caplog):
+    client = HTTPClient(retries=2, backoff=0)
+
+    async def run():
+        try:
+            await client.post_form("http://127.0.0.1:{}/api/generate".format(free_port()), fields={"race": 1})
+        finally:
+            await client.close()
+
+    with caplog.at_level(logging.WARNING, logger="src.http_client"):
+        with pytest.raises(HTTPError):
+            asyncio.run(run())
+    # Tres intentos: dos avisos de reintento y el error final
+    assert [record.message[-11:] for record in caplog.records] == ["(intento 1)", "(intento 2)"]
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from src.provisioning import Provisioner
+
+
+class FakeServer:
+    """
+    Servidor simulado: el objeto se crea en cuanto llega la petición, y la respuesta tarda lo indicado. Si la petición
+    se cancela mientras espera la respuesta, el objeto queda creado igualmente.
+    """
+    def __init__(self):
+        self.items = set()
+
+    def create(self, name, delay, fail=False):
+        async def create():
+            if not fail:
+                self.items.add(name)
+            await asyncio.sleep(delay)
+            if fail:
+                raise RuntimeError("Error al crear {}".format(name))
+            return name
+        return create
+
+    async def delete(self, name):
+        self.items.discard(name)
+
+
+def run(provisioner):
+    return asyncio.run(provisioner.run())
+
+
+def test_independent_steps_run_concurrently():
+    server = FakeServer()
+    provisioner = Provisioner("test")
+    provisioner.add("role", server.create("role", 0.05), undo=server.delete)
+    provisioner.add("category", server.create("category", 0.05), undo=server.delete)
+    provisioner.add("submit", lambda category: server.create("submit", 0.01)(), deps=["category"], undo=server.delete)
+    results = run(provisioner)
+    assert results == {"role": "role", "category": "category", "submit": "submit"}
+    assert server.items == {"role", "category", "submit"}
+
+
+def test_failure_undoes_steps_that_were_in_flight():
+    server = FakeServer()
+    provisioner = Provisioner("test")
+    provisioner.add("role", server.create("role", 0.01, fail=True), undo=server.delete)
+    # La categoría sigue en curso cuando falla el rol: debe terminar y deshacerse
+    provisioner.add("category", server.create("category", 0.05), undo=server.delete)
+    provisioner.add("submit", lambda category: server.create("submit", 0.01)(), deps=["category"], undo=server.delete)
+    with pytest.raises(RuntimeError):
+        run(provisioner)
+    assert server.items == set()
+
+
+def test_failure_does_not_start_pending_steps():
+    server = FakeServer()
+    started = []
+
+    def submit(category):
+        started.append("submit")
+        return server.create("submit", 0.01)()
+
+    provisioner = Provisioner("test")
+    provisioner.add("role", server.create("role", 0.01, fail=True), undo=server.delete)
+    provisioner.add("category", server.create("category", 0.05), undo=server.delete)
+    provisioner.add("submit", submit, deps=["category"], undo=server.delete)
+    with pytest.raises(RuntimeError):
+        run(provisioner)
+    assert started == []
+    assert server.items == set()
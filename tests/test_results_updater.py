@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("discord")
+
+from src.results_updater import ResultsUpdater
+
+
+class FakeMessage:
+    """
+    Mensaje simulado: guarda cada contenido editado y falla con los errores de la lista errors, uno por edición.
+    """
+    def __init__(self, delay=0, errors=()):
+        self.id = 1
+        self.delay = delay
+        self.errors = list(errors)
+        self.edited = []
+
+    async def edit(self, content):
+        await asyncio.sleep(self.delay)
+        if self.errors:
+            error = self.errors.pop(0)
+            if error:
+                raise error
+        self.edited.append(content)
+
+
+class FakeChannel:
+    def __init__(self, message):
+        self.message = message
+
+    def get_partial_message(self, message_id):
+        return self.message
+
+
+class FakeLeaderboard:
+    def __init__(self):
+        self.version = 0
+
+    def render(self):
+        return "v{}".format(self.version)
+
+
+def updater(message, interval=10):
+    leaderboard = FakeLeaderboard()
+    return ResultsUpdater(FakeChannel(message), message.id, leaderboard, interval), leaderboard
+
+
+def test_close_flushes_pending_edit():
+    message = FakeMessage()
+
+    async def run():
+        results, leaderboard = updater(message)
+        results.update()
+        await asyncio.sleep(0.01)
+        # Cambio durante el intervalo: sin close() no se enviaría hasta dentro de 10 s
+        leaderboard.version = 1
+        results.update()
+        await results.close()
+
+    asyncio.run(run())
+    assert message.edited == ["v0", "v1"]
+
+
+def test_close_resends_interrupted_edit():
+    message = FakeMessage(delay=0.1)
+
+    async def run():
+        results, _ = updater(message)
+        results.update()
+        await asyncio.sleep(0.05)
+        await results.close()
+
+    asyncio.run(run())
+    assert message.edited == ["v0"]
+
+
+def test_unexpected_error_does_not_stop_the_loop():
+    message = FakeMessage(errors=[RuntimeError("fallo")])
+
+    async def run():
+        results, leaderboard = updater(message, interval=0)
+        results.update()
+        await asyncio.sleep(0.01)
+        leaderboard.version = 1
+        results.update()
+        await asyncio.sleep(0.05)
+        assert not results.dirty
+        await results.close()
+        return results
+
+    results = asyncio.run(run())
+    assert message.edited == ["v1"]
+    assert (results.requested, results.edits) == (2, 1)